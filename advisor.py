@@ -1,18 +1,89 @@
 # advisor.py
 import os
 import json
-from typing import List, Dict
-from calculator import simulate_flex, simulate_locked, simulate_main, TopUp, Withdrawal
+import time
+import sqlite3
+import hashlib
+import asyncio
+import weakref
+import threading
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Dict
+from calculator import TopUp, Withdrawal
+from cache import ResponseCache, simulate_cached
+from metrics import OPENAI_LATENCY, ADVISOR_TOOL_CALLS, ADVISOR_CACHE, ADVISOR_FAST_REPLIES, mark_ready, record_usage
+from parsers import Extraction, extract
+from registry import REGISTRY, Truth
+from scheduler import scheduler_from_env
+from sessions import facts_summary, fold, message, session_store_from_env, window
+from profiling import profile_block, profiled
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 USE_OPENAI = bool(OPENAI_API_KEY)
+MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+MAX_TOOL_ROUNDS = int(os.getenv("ADVISOR_MAX_TOOL_ROUNDS", "3"))
+_TOOL_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("ADVISOR_TOOL_WORKERS", "4")))
+# Replies to short conversations are cached in this SQLite file; unset or empty: no cache
+CACHE_PATH = os.getenv("ADVISOR_CACHE_PATH", "")
+CACHE_BYTES = int(float(os.getenv("ADVISOR_CACHE_MB", "64")) * (1 << 20))
+CACHE_MAX_TURNS = int(os.getenv("ADVISOR_CACHE_MAX_TURNS", "2"))  # user turns, including the new one
+# Simulation requests parsed at least this confidently are answered without the LLM (> 1 disables)
+FASTPATH_CONFIDENCE = float(os.getenv("ADVISOR_FASTPATH_CONFIDENCE", "0.8"))
+# Token budget for the history sent per turn; older turns are dropped (chat) or summarized (sessions)
+HISTORY_TOKENS = int(os.getenv("ADVISOR_HISTORY_TOKENS", "1500"))
+SUMMARY_MODE = os.getenv("ADVISOR_SUMMARY", "facts")  # facts (local) | llm
+SESSIONS = session_store_from_env()
+# async turns queue on a per-session asyncio.Lock; (loop id, session id) -> lock, gone once unused
+_session_locks: "weakref.WeakValueDictionary[tuple, asyncio.Lock]" = weakref.WeakValueDictionary()
+SESSION_LOCK_POLL = 0.05  # seconds between tries for a session lock held by a blocking caller
+# every OpenAI call goes through here: concurrency cap, coalescing of identical calls, retries
+SCHEDULER = scheduler_from_env()
 
-if USE_OPENAI:
-    from openai import OpenAI
-    client = OpenAI()
+# OpenAI clients are created on first use: importing openai costs more than the rest of this module.
+# Their own retries are off; SCHEDULER retries within the call's deadline instead.
+client = None
+aclient = None
+_client_lock = threading.Lock()
 
-with open("truth.json") as f:
-    TRUTH = json.load(f)
+def _client():
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(max_retries=0)
+    return client
+
+def _aclient():
+    global aclient
+    if aclient is None:
+        with _client_lock:
+            if aclient is None:
+                from openai import AsyncOpenAI
+                aclient = AsyncOpenAI(max_retries=0)
+    return aclient
+
+# The reply cache is opened on the first lookup, so importing this module never touches the disk
+CHAT_CACHE = None
+_cache_opened = False
+
+def _chat_cache():
+    """ CHAT_CACHE, opened on first use; None when disabled or the file cannot be opened. """
+    global CHAT_CACHE, _cache_opened
+    if not _cache_opened:
+        with _client_lock:
+            if not _cache_opened:
+                if USE_OPENAI and CACHE_PATH:
+                    try:
+                        cache = ResponseCache(CACHE_PATH, CACHE_BYTES)
+                        cache.set_truth(TRUTH_VERSION)
+                        CHAT_CACHE = cache
+                    except sqlite3.DatabaseError:  # read-only or unwritable location: run without it
+                        CHAT_CACHE = None
+                _cache_opened = True
+    return CHAT_CACHE
 
 SYSTEM_PROMPT = """
 You are SmartSaver Advisor for Creditstar/Monefit.
@@ -23,6 +94,125 @@ TRUTH:
 {truth}
 """.strip()
 
+TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "simulate_returns",
+        "description": "Simulate returns for flex, locked, or main",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "product": {"type": "string", "enum": ["flex","locked","main"]},
+                "initial": {"type": "number"},
+                "term_months": {"type": "integer"},
+                "topups": {"type": "array","items":{"type":"object","properties":{"month":{"type":"integer"},"amount":{"type":"number"}}}},
+                "withdrawals": {"type": "array","items":{"type":"object","properties":{"month":{"type":"integer"},"amount":{"type":"number"}}}}
+            },
+            "required": ["product","initial","term_months"]
+        }
+    }
+}]
+
+def _use_truth(truth: Truth):
+    """ Rebuild what depends on truth.json (rules, system prompt, reply cache version); run on every reload. """
+    global TRUTH, TRUTH_VERSION, _SYSTEM_MESSAGE, _SYSTEM_DIGEST
+    # the prompt embeds the whole config, so it is built once per version, not per call
+    system = {"role": "system", "content": SYSTEM_PROMPT.format(truth=json.dumps(truth.config, separators=(",", ":")))}
+    TRUTH, TRUTH_VERSION = truth.config, truth.version
+    _SYSTEM_MESSAGE, _SYSTEM_DIGEST = system, hashlib.sha1(system["content"].encode()).hexdigest()
+    if CHAT_CACHE is not None:
+        CHAT_CACHE.set_truth(TRUTH_VERSION)
+
+REGISTRY.subscribe(_use_truth)
+
+def _refresh_truth():
+    """ Pick up truth.json edits; the registry calls _use_truth when the file changed. """
+    REGISTRY.get()
+
+_refresh_truth()
+
+def _system_message() -> Dict[str, str]:
+    return _SYSTEM_MESSAGE
+
+def _request_key(msgs: List[Dict], kwargs: Dict) -> str:
+    """ Identity of one completion request, for coalescing identical calls in flight. """
+    return hashlib.sha256(json.dumps([MODEL, msgs, kwargs], sort_keys=True, default=str).encode()).hexdigest()
+
+def _complete(msgs: List[Dict], **kwargs):
+    """ One (non-streaming) chat completion through SCHEDULER. """
+    def request(timeout: float):
+        start = time.perf_counter()
+        resp = _client().chat.completions.create(model=MODEL, messages=msgs, timeout=timeout, **kwargs)
+        OPENAI_LATENCY.observe(time.perf_counter() - start, "sync")
+        record_usage(resp.usage)  # once per request, not per coalesced caller
+        return resp
+    return SCHEDULER.call(request, _request_key(msgs, kwargs))
+
+def _normalize(text: str | None) -> str:
+    return " ".join((text or "").split()).casefold()
+
+def _cache_key(history: List[Dict[str, str]], user_msg: str) -> str | None:
+    """
+    Digest of the conversation state (model, prompt, normalized user/assistant turns), or
+    None when it should not be cached: cache disabled, too many turns, or other roles.
+    """
+    if _chat_cache() is None or any(m.get("role") not in ("user", "assistant") for m in history):
+        return None
+    if sum(m["role"] == "user" for m in history) + 1 > CACHE_MAX_TURNS:
+        return None
+    state = [MODEL, _SYSTEM_DIGEST, MAX_TOOL_ROUNDS] + [[m["role"], _normalize(m.get("content"))] for m in history]
+    state.append(["user", _normalize(user_msg)])
+    return hashlib.sha256(json.dumps(state).encode()).hexdigest()
+
+def _cached_reply(key: str | None) -> str | None:
+    if key is None:
+        return None
+    try:
+        hit = CHAT_CACHE.get(key)
+    except sqlite3.DatabaseError:
+        return None
+    ADVISOR_CACHE.inc("hit" if hit is not None else "miss")
+    return hit["content"] if hit is not None else None
+
+def _store_reply(key: str | None, content: str | None):
+    if key is not None and content:
+        try:
+            CHAT_CACHE.put(key, {"content": content})
+        except sqlite3.DatabaseError:  # e.g. the disk filled up; the reply itself is fine
+            pass
+
+@profiled
+def _run_tool(name: str, arguments: str):
+    """ Execute a tool call from the model; returns (parsed args, result dict). """
+    try:
+        args = json.loads(arguments)
+        if name != "simulate_returns":
+            return args, {"error": f"unknown tool {name}"}
+        result = _simulate(args["product"], args["initial"], args["term_months"],
+                           args.get("topups"), args.get("withdrawals"))
+    except (ValueError, KeyError, TypeError) as e:
+        # report bad arguments back to the model instead of failing the turn
+        return {}, {"error": f"invalid arguments: {e}"}
+    return args, result
+
+def _run_tools(calls: List[Dict]) -> List[tuple]:
+    """ Run every tool call from one model turn, concurrently; results keep call order. """
+    for c in calls:
+        ADVISOR_TOOL_CALLS.inc(c["name"])
+    if len(calls) == 1:
+        return [_run_tool(calls[0]["name"], calls[0]["arguments"])]
+    # each call runs in a copy of this context so per-request state (e.g. profiling) follows it
+    ctxs = [contextvars.copy_context() for _ in calls]
+    return list(_TOOL_POOL.map(lambda ctx, c: ctx.run(_run_tool, c["name"], c["arguments"]), ctxs, calls))
+
+def _append_tool_turn(msgs: List[Dict], content: str | None, calls: List[Dict], results: List[tuple]):
+    """ Append the assistant tool-call message and one tool message per call. """
+    msgs.append({"role": "assistant", "content": content or None, "tool_calls": [{
+        "id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]},
+    } for c in calls]})
+    for c, (_, result) in zip(calls, results):
+        msgs.append({"role": "tool", "tool_call_id": c["id"], "name": c["name"], "content": json.dumps(result)})
+
 def _simulate(product: str, initial: float, term_months: int,
               topups=None, withdrawals=None):
     """
@@ -38,53 +228,109 @@ def _simulate(product: str, initial: float, term_months: int,
     topups = topups or []
     withdrawals = withdrawals or []
     if product == "flex":
-        return simulate_flex(
-            initial, term_months, TRUTH["products"]["flex_vault_apr"],
+        return simulate_cached(
+            "flex", initial, term_months, TRUTH["products"]["flex_vault_apr"],
             [TopUp(**t) for t in topups],
             [Withdrawal(**w) for w in withdrawals]
         )
     if product == "locked":
-        return simulate_locked(initial, term_months, TRUTH["products"]["locked_vault_apr"])
-    return simulate_main(initial, term_months, TRUTH["products"]["main_account_apr"])
+        return simulate_cached("locked", initial, term_months, TRUTH["products"]["locked_vault_apr"])
+    return simulate_cached("main", initial, term_months, TRUTH["products"]["main_account_apr"])
+
+def _plan(ex: Extraction) -> Dict | None:
+    """ Simulation inputs for an extraction under TRUTH's rules, or None when it breaks them. """
+    terms, flex_rules = TRUTH["terms"], TRUTH["flex_vault"]
+    term = ex.term_months or terms["min_months"]
+    if not terms["min_months"] <= term <= terms["max_months"]:
+        return None
+    topups = [TopUp(m, a) for m, a in ex.topups]
+    if ex.topup_amount:
+        # weekly top-ups are folded into monthly ones
+        step, amount = (ex.topup_every, ex.topup_amount) if ex.topup_every else (1, ex.topup_amount * 52 / 12)
+        topups += [TopUp(m, amount) for m in range(step, term, step)]
+    withdrawals = [Withdrawal(m, a) for m, a in ex.withdrawals]
+    if ((topups and not flex_rules["allow_topups"]) or len(withdrawals) > flex_rules["max_withdrawals"]
+            or any(not 0 < e.month < term for e in topups + withdrawals)):
+        return None
+    return {"initial": ex.amount, "term": term, "topups": topups, "withdrawals": withdrawals}
+
+def _plan_reply(plan: Dict) -> str:
+    """ Flex / Locked / Main figures for a plan, straight from the calculator. """
+    products = TRUTH["products"]
+    initial, term, topups, withdrawals = plan["initial"], plan["term"], plan["topups"], plan["withdrawals"]
+    flex = simulate_cached("flex", initial, term, products["flex_vault_apr"], topups, withdrawals, "summary")
+    locked = simulate_cached("locked", initial, term, products["locked_vault_apr"])
+    main = simulate_cached("main", initial, term, products["main_account_apr"])
+    extras = "".join(f", top-up €{t.amount:,.0f} @ m{t.month}" for t in topups[:1])
+    extras += f" (+{len(topups) - 1} more)" if len(topups) > 1 else ""
+    extras += "".join(f", withdraw €{w.amount:,.0f} @ m{w.month}" for w in withdrawals)
+    lines = [
+        "Illustrative only.", "",
+        f"€{initial:,.2f} over {term}m{extras}:",
+        f"Flex: interest ≈ €{flex['interest_accrued']}, final balance €{flex['final_balance']}",
+    ]
+    if not withdrawals:
+        # illustrate flex with one withdrawal example
+        example = [Withdrawal(6, min(2000, max(0, initial * 0.4)))]
+        flex_break = simulate_cached("flex", initial, term, products["flex_vault_apr"], topups, example, "summary")
+        lines.append(f"Flex (break once @ m6): interest ≈ €{flex_break['interest_accrued']}")
+    lines += [
+        f"Locked ({term}m): interest ≈ €{locked['interest_accrued']}",
+        f"Main account: interest ≈ €{main['interest_accrued']}", "",
+        "If you'd like, tell me a withdrawal amount and month, e.g. 'withdraw 1500 in month 8'.",
+    ]
+    return "\n".join(lines)
+
+def _fast_reply(user_msg: str, history: List[Dict[str, str]]) -> str | None:
+    """
+    Reply for a confidently parsed simulation request, computed locally; None otherwise.
+    Only an opening message qualifies: the parse sees no earlier turns or session summary,
+    so a follow-up ("now withdraw 1500 in month 8") goes to the model with its context.
+    """
+    if any(m["role"] in ("user", "system") for m in history):
+        return None
+    ex = extract(user_msg)
+    if ex.confidence < FASTPATH_CONFIDENCE:
+        return None
+    plan = _plan(ex)
+    if plan is None:
+        return None
+    ADVISOR_FAST_REPLIES.inc()
+    return _plan_reply(plan)
 
 def _fallback_reply(user_msg: str) -> str:
     """
     Lightweight scripted flow so the demo never blocks.
-    Tries to find an amount in the user text; otherwise asks for one.
+    Simulates whatever the extraction engine finds; otherwise asks for an amount.
     Args:
         user_msg: str
     Returns: str
     """
-    import re
-    nums = re.findall(r"\d[\d,\.]*", user_msg.replace("€",""))
-    if not nums:
+    ex = extract(user_msg)
+    if ex.amount is None or ex.amount <= 0:
         return ("Let's set up your plan. How much would you like to invest initially? "
                 "(e.g., 5000) — illustrative only.")
+    # fall back to the amount alone when the rest breaks the product rules
+    return _plan_reply(_plan(ex) or _plan(Extraction(amount=ex.amount)))
 
-    initial = float(nums[0].replace(",", ""))
-    term = TRUTH["terms"]["min_months"]
-    # illustrate flex with one withdrawal example
-    sim_flex_break = _simulate("flex", initial, term, withdrawals=[{"month": 6, "amount": min(2000, max(0, initial*0.4))}])
-    sim_locked = _simulate("locked", initial, term)
-    return (
-        f"Illustrative only.\n\n"
-        f"Flex (break once @ m6): interest ≈ €{sim_flex_break['interest_accrued']}\n"
-        f"Locked ({term}m): interest ≈ €{sim_locked['interest_accrued']}\n\n"
-        f"If you'd like, tell me a withdrawal amount and month, e.g. 'withdraw 1500 in month 8'."
-    )
-
-def chat(user_msg: str, history: List[Dict[str, str]] | None = None):
+def chat(user_msg: str, history: List[Dict[str, str]] | None = None, profile: bool = False):
     """
     Main chat function to handle user messages and maintain history.
     Uses OpenAI API if key is set; otherwise falls back to scripted responses.
     Args:
         user_msg: str - the latest user message
         history: List of previous messages (dicts with 'role' and 'content')
+        profile: profile this call into SIM_PROFILE_DIR (see profiling.py)
     Returns:
         assistant_msg: dict with 'role' and 'content'
         updated_history: list including the new user and assistant messages
     """
     history = history or []
+    _refresh_truth()
+    with profile_block("advisor_chat", {"user_msg": user_msg, "history": history, "model": MODEL}, force=profile):
+        return _chat(user_msg, history)
+
+def _chat(user_msg: str, history: List[Dict[str, str]]):
 
     # If no key, use fallback instead of blocking the demo.
     if not USE_OPENAI:
@@ -93,44 +339,188 @@ def chat(user_msg: str, history: List[Dict[str, str]] | None = None):
         updated = history + [{"role": "user", "content": user_msg}, assistant_msg]
         return assistant_msg, updated
 
-    tools = [{
-        "type": "function",
-        "function": {
-            "name": "simulate_returns",
-            "description": "Simulate returns for flex, locked, or main",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "product": {"type": "string", "enum": ["flex","locked","main"]},
-                    "initial": {"type": "number"},
-                    "term_months": {"type": "integer"},
-                    "topups": {"type": "array","items":{"type":"object","properties":{"month":{"type":"integer"},"amount":{"type":"number"}}}},
-                    "withdrawals": {"type": "array","items":{"type":"object","properties":{"month":{"type":"integer"},"amount":{"type":"number"}}}}
-                },
-                "required": ["product","initial","term_months"]
-            }
-        }
-    }]
-
-    sys = {"role": "system", "content": SYSTEM_PROMPT.format(truth=json.dumps(TRUTH, indent=2))}
-    msgs = [sys] + history + [{"role": "user", "content": user_msg}]
-    resp = client.chat.completions.create(model="gpt-4o-mini", messages=msgs, tools=tools, tool_choice="auto")
-    msg = resp.choices[0].message
-
-    if msg.tool_calls:
-        call = msg.tool_calls[0]
-        if call.function.name == "simulate_returns":
-            args = json.loads(call.function.arguments)
-            result = _simulate(args["product"], args["initial"], args["term_months"],
-                               args.get("topups"), args.get("withdrawals"))
-            msgs.append({"role": "assistant", "content": None, "tool_calls": msg.tool_calls})
-            msgs.append({"role": "tool", "tool_call_id": call.id, "name": "simulate_returns", "content": json.dumps(result)})
-            resp2 = client.chat.completions.create(model="gpt-4o-mini", messages=msgs)
-            final = resp2.choices[0].message
-            assistant_msg = {"role": "assistant", "content": final.content}
-            updated = history + [{"role": "user", "content": user_msg}, assistant_msg]
-            return assistant_msg, updated
+    # only the newest turns that fit the token budget are sent
+    sent = window(history, HISTORY_TOKENS)
+    # plain simulation requests are answered locally, repeated openers from the cache
+    key = _cache_key(sent, user_msg)
+    content = _fast_reply(user_msg, history)
+    if content is None:
+        content = _cached_reply(key)
+    if content is not None:
+        assistant_msg = {"role": "assistant", "content": content}
+        return assistant_msg, history + [{"role": "user", "content": user_msg}, assistant_msg]
+
+    msgs = [_system_message()] + sent + [{"role": "user", "content": user_msg}]
+    for rounds in range(MAX_TOOL_ROUNDS + 1):
+        # the last allowed round goes without tools so the model has to answer
+        kwargs = {"tools": TOOLS, "tool_choice": "auto"} if rounds < MAX_TOOL_ROUNDS else {}
+        msg = _complete(msgs, **kwargs).choices[0].message
+        if not msg.tool_calls:
+            break
+        calls = [{"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+                 for tc in msg.tool_calls]
+        _append_tool_turn(msgs, msg.content, calls, _run_tools(calls))
 
+    _store_reply(key, msg.content)
     assistant_msg = {"role": "assistant", "content": msg.content}
     updated = history + [{"role": "user", "content": user_msg}, assistant_msg]
     return assistant_msg, updated
+
+async def _astream(msgs: List[Dict], tool_calls: Dict[int, Dict], **kwargs) -> AsyncIterator[str]:
+    """
+    Stream one completion, yielding content deltas as they arrive.
+    Tool-call fragments are accumulated into tool_calls, keyed by their index.
+    """
+    async def request(timeout: float):
+        start = time.perf_counter()
+        stream = await _aclient().chat.completions.create(model=MODEL, messages=msgs, stream=True, timeout=timeout,
+                                                          stream_options={"include_usage": True}, **kwargs)
+
+        async def chunks():
+            # runs once per request, however many coalesced callers read the chunks
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        # the usage-only chunk that closes the stream
+                        record_usage(getattr(chunk, "usage", None))
+                    yield chunk
+                OPENAI_LATENCY.observe(time.perf_counter() - start, "stream")
+            finally:
+                await stream.close()
+        return chunks()
+
+    async for chunk in SCHEDULER.astream(request, _request_key(msgs, dict(kwargs, stream=True))):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            yield delta.content
+        for tc in delta.tool_calls or []:
+            slot = tool_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+            if tc.id:
+                slot["id"] = tc.id
+            if tc.function and tc.function.name:
+                slot["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                slot["arguments"] += tc.function.arguments
+
+async def achat(user_msg: str, history: List[Dict[str, str]] | None = None) -> AsyncIterator[Dict]:
+    """
+    Async, streaming variant of chat() built on the async OpenAI client.
+    Tool calls run between model turns (all calls of a turn together) without blocking the loop.
+    Args:
+        user_msg: str - the latest user message
+        history: List of previous messages (dicts with 'role' and 'content')
+    Yields:
+        {"type": "token", "content": str} for each assistant text delta
+        {"type": "tool", "name": str, "arguments": dict, "result": dict} for each tool call run
+        {"type": "done", "message": dict, "history": list} once, at the end
+    """
+    history = history or []
+    _refresh_truth()
+    sent = window(history, HISTORY_TOKENS)
+    key = _cache_key(sent, user_msg) if USE_OPENAI else None
+    content = _fast_reply(user_msg, history) if USE_OPENAI else None
+    if content is None:
+        content = _cached_reply(key)
+
+    if not USE_OPENAI:
+        content = _fallback_reply(user_msg)
+        yield {"type": "token", "content": content}
+    elif content is not None:
+        yield {"type": "token", "content": content}
+    else:
+        msgs = [_system_message()] + sent + [{"role": "user", "content": user_msg}]
+        for rounds in range(MAX_TOOL_ROUNDS + 1):
+            kwargs = {"tools": TOOLS, "tool_choice": "auto"} if rounds < MAX_TOOL_ROUNDS else {}
+            parts, tool_calls = [], {}
+            async for text in _astream(msgs, tool_calls, **kwargs):
+                parts.append(text)
+                yield {"type": "token", "content": text}
+            if not tool_calls:
+                break
+            calls = [tool_calls[i] for i in sorted(tool_calls)]
+            results = await asyncio.to_thread(_run_tools, calls)
+            for c, (args, result) in zip(calls, results):
+                yield {"type": "tool", "name": c["name"], "arguments": args, "result": result}
+            _append_tool_turn(msgs, "".join(parts), calls, results)
+        content = "".join(parts)
+        _store_reply(key, content)
+
+    assistant_msg = {"role": "assistant", "content": content}
+    updated = history + [{"role": "user", "content": user_msg}, assistant_msg]
+    yield {"type": "done", "message": assistant_msg, "history": updated}
+
+# ---------- Server-side sessions ----------
+SUMMARY_PROMPT = ("Summarize this savings-advice conversation for the advisor in at most 120 words. "
+                  "Keep every amount, term, month, goal and decision; drop pleasantries.")
+
+def _llm_summary(previous: str, dropped: List[Dict]) -> str:
+    """ Summarizer for ADVISOR_SUMMARY=llm: one short completion folding dropped turns into the summary. """
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in dropped)
+    resp = _complete([
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Summary so far:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"},
+    ], max_tokens=250)
+    return resp.choices[0].message.content or previous
+
+def _begin_turn(session_id: str, user_msg: str):
+    """ Load the session, add the user message and fold it to budget; returns (session, history to send). """
+    session = SESSIONS.load(session_id)
+    session.messages.append(message("user", user_msg))
+    fold(session, HISTORY_TOKENS, _llm_summary if SUMMARY_MODE == "llm" and USE_OPENAI else facts_summary)
+    return session, session.history()[:-1]
+
+def chat_session(session_id: str, user_msg: str, profile: bool = False) -> Dict[str, str]:
+    """
+    chat() with the history kept server-side in SESSIONS instead of sent by the caller.
+    Older turns are folded into a summary once the window passes ADVISOR_HISTORY_TOKENS.
+    Args:
+        session_id: str - any caller-chosen id; unknown ids start a new conversation
+        user_msg: str - the latest user message
+        profile: profile this call into SIM_PROFILE_DIR (see profiling.py)
+    Returns:
+        assistant_msg: dict with 'role' and 'content'
+    """
+    with SESSIONS.lock(session_id):
+        session, history = _begin_turn(session_id, user_msg)
+        assistant_msg, _ = chat(user_msg, history, profile)
+        session.messages.append(message("assistant", assistant_msg["content"]))
+        SESSIONS.save(session)
+    return assistant_msg
+
+@contextlib.asynccontextmanager
+async def _session_turn(session_id: str):
+    """
+    Hold session_id's turn from async code. Turns on this event loop wait on an asyncio.Lock;
+    SESSIONS.lock (shared with chat_session) is then taken without blocking, polling while a
+    thread holds it, so a cancelled waiter never leaves it locked or ties up a thread.
+    """
+    key = (id(asyncio.get_running_loop()), session_id)
+    local = _session_locks.get(key)
+    if local is None:
+        local = _session_locks[key] = asyncio.Lock()
+    async with local:
+        stripe = SESSIONS.lock(session_id)
+        while not stripe.acquire(blocking=False):
+            await asyncio.sleep(SESSION_LOCK_POLL)
+        try:
+            yield
+        finally:
+            stripe.release()
+
+async def achat_session(session_id: str, user_msg: str) -> AsyncIterator[Dict]:
+    """
+    Streaming variant of chat_session(); yields the same events as achat(), except that
+    "done" carries the session_id instead of the full history.
+    """
+    async with _session_turn(session_id):
+        session, history = await asyncio.to_thread(_begin_turn, session_id, user_msg)
+        async for event in achat(user_msg, history):
+            if event["type"] == "done":
+                session.messages.append(message("assistant", event["message"]["content"]))
+                await asyncio.to_thread(SESSIONS.save, session)
+                event = {"type": "done", "message": event["message"], "session_id": session_id}
+            yield event
+
+mark_ready("advisor")
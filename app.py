@@ -1,13 +1,64 @@
 # app.py
-import json
-from fastapi import FastAPI
-from pydantic import BaseModel
-from calculator import simulate_flex, simulate_locked, simulate_main, TopUp, Withdrawal
+from contextlib import asynccontextmanager
+from typing import Literal
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, ValidationError
+import numpy as np
+from calculator import (simulate_flex_batch, simulate_locked_batch, simulate_main_batch, simulate_sweep,
+                        flex_passes, iter_flex, iter_locked, iter_main, TopUp, Withdrawal)
+from cache import SIM_CACHE, simulate_cached
+from capture import CaptureMiddleware, capture_from_env
+from codec import BodyError, MSGPACK_TYPE, dumps, loads, pack, parse_flex, parse_simple, read_body, respond, wants_msgpack
+import metrics
+from profiling import PROFILE_DIR, ProfileMiddleware, profiled
+from registry import REGISTRY
 
-with open("truth.json") as f:
-    TRUTH = json.load(f)
+REGISTRY.get()  # fail at startup, not on the first request, if truth.json is missing or invalid
 
-app = FastAPI(title="SmartSaver Flex Vault API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    metrics.mark_ready("api")  # process start -> serving, exported at /metrics
+    yield
+
+app = FastAPI(title="SmartSaver Flex Vault API", lifespan=lifespan)
+
+# Latency/status per /simulate/* route, served at /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Optional traffic capture for /simulate/* (set SIM_CAPTURE_PATH to enable)
+CAPTURE = capture_from_env()
+if CAPTURE:
+    app.add_middleware(CaptureMiddleware, capture=CAPTURE)
+
+# On-demand profiling of /simulate/* requests sent with X-Profile: 1 (set SIM_PROFILE_DIR to enable)
+if PROFILE_DIR:
+    app.add_middleware(ProfileMiddleware)
+
+# ?output= on /simulate/*: per-month rows (default), totals only, or parallel arrays
+OutputMode = Literal["rows", "summary", "columnar"]
+# single-product routes can also stream NDJSON rows as they are produced, per month or per day
+StreamableOutput = Literal["rows", "summary", "columnar", "stream"]
+Granularity = Literal["month", "day"]
+STREAM_FLUSH_ROWS = 256  # rows per streamed chunk; the first row is sent on its own
+
+def _stream_schedule(rows, summary):
+    """ NDJSON schedule rows from a lazy iterator, then one {"summary": ...} line. """
+    limit, pending = 1, []
+    for row in rows:
+        pending.append(dumps(row))
+        if len(pending) >= limit:
+            yield b"\n".join(pending) + b"\n"
+            limit, pending = STREAM_FLUSH_ROWS, []
+    pending.append(dumps({"summary": summary()}))
+    yield b"\n".join(pending) + b"\n"
+
+def _schedule_response(request: Request, output: str, granularity: str, rows, summary, compute):
+    if output == "stream":
+        return StreamingResponse(_stream_schedule(rows(), summary), media_type="application/x-ndjson")
+    if granularity != "month":
+        raise HTTPException(status_code=400, detail="granularity=day needs output=stream")
+    return respond(request, compute())
 
 class FlexRequest(BaseModel):
     initial: float
@@ -15,24 +66,314 @@ class FlexRequest(BaseModel):
     topups: list[TopUp] = []
     withdrawals: list[Withdrawal] = []
 
+class SimpleRequest(BaseModel):
+    initial: float
+    term_months: int
+
+# Bodies are JSON or msgpack and are checked by codec's hand-written parsers rather than
+# per-event pydantic validation; the models stay as the documented schema (see _openapi).
+BODY_MODELS = {}
+
+def _documented_body(model, array: bool = False, ndjson: bool = False) -> dict:
+    """ openapi_extra for a route that reads its own body: model (or a list of it) as JSON/msgpack. """
+    BODY_MODELS[model.__name__] = model
+    schema = {"$ref": f"#/components/schemas/{model.__name__}"}
+    if array:
+        schema = {"type": "array", "items": schema}
+    content = {"application/json": {"schema": schema}, MSGPACK_TYPE: {"schema": schema}}
+    if ndjson:
+        content["application/x-ndjson"] = {"schema": {"$ref": f"#/components/schemas/{model.__name__}"}}
+    return {"requestBody": {"required": True, "content": content}}
+
+async def flex_body(request: Request) -> FlexRequest:
+    try:
+        return FlexRequest.model_construct(**parse_flex(await read_body(request)))
+    except BodyError as e:
+        raise HTTPException(status_code=422, detail=e.detail())
+
+async def simple_body(request: Request) -> SimpleRequest:
+    try:
+        return SimpleRequest.model_construct(**parse_simple(await read_body(request)))
+    except BodyError as e:
+        raise HTTPException(status_code=422, detail=e.detail())
+
 @app.get("/truth")
-def get_truth(): return TRUTH
+def get_truth(): return REGISTRY.get().config
 
-@app.post("/simulate/flex")
-def flex(req: FlexRequest):
-    apr = TRUTH["products"]["flex_vault_apr"]
-    return simulate_flex(req.initial, req.term_months, apr, req.topups, req.withdrawals)
+@app.post("/simulate/flex", openapi_extra=_documented_body(FlexRequest))
+@profiled
+def flex(request: Request, req: FlexRequest = Depends(flex_body), output: StreamableOutput = "rows",
+         granularity: Granularity = "month"):
+    apr = REGISTRY.get().aprs["flex"]
+    return _schedule_response(
+        request, output, granularity,
+        lambda: iter_flex(req.initial, req.term_months, apr, req.topups, req.withdrawals, granularity),
+        lambda: simulate_cached("flex", req.initial, req.term_months, apr, req.topups, req.withdrawals, "summary"),
+        lambda: simulate_cached("flex", req.initial, req.term_months, apr, req.topups, req.withdrawals, output),
+    )
 
-class SimpleRequest(BaseModel):
+@app.post("/simulate/locked", openapi_extra=_documented_body(SimpleRequest))
+@profiled
+def locked(request: Request, req: SimpleRequest = Depends(simple_body), output: StreamableOutput = "rows",
+           granularity: Granularity = "month"):
+    apr = REGISTRY.get().aprs["locked"]
+    return _schedule_response(
+        request, output, granularity,
+        lambda: iter_locked(req.initial, req.term_months, apr, granularity),
+        lambda: simulate_cached("locked", req.initial, req.term_months, apr),
+        lambda: simulate_cached("locked", req.initial, req.term_months, apr),
+    )
+
+@app.post("/simulate/main", openapi_extra=_documented_body(SimpleRequest))
+@profiled
+def main(request: Request, req: SimpleRequest = Depends(simple_body), output: StreamableOutput = "rows",
+         granularity: Granularity = "month"):
+    apr = REGISTRY.get().aprs["main"]
+    return _schedule_response(
+        request, output, granularity,
+        lambda: iter_main(req.initial, req.term_months, apr, granularity),
+        lambda: simulate_cached("main", req.initial, req.term_months, apr),
+        lambda: simulate_cached("main", req.initial, req.term_months, apr),
+    )
+
+@app.post("/simulate/compare", openapi_extra=_documented_body(FlexRequest))
+@profiled
+def compare(request: Request, req: FlexRequest = Depends(flex_body), output: OutputMode = "rows"):
+    """ Locked, main and flex for one scenario in a single response. """
+    aprs = REGISTRY.get().aprs
+    return respond(request, {
+        "locked": simulate_cached("locked", req.initial, req.term_months, aprs["locked"]),
+        "main": simulate_cached("main", req.initial, req.term_months, aprs["main"]),
+        "flex": simulate_cached("flex", req.initial, req.term_months, aprs["flex"],
+                                req.topups, req.withdrawals, output),
+    })
+
+# ---------- Sweep ----------
+MAX_SWEEP_MONTHS = 1_200_000  # cells × longest term: what the flex batch pass simulates
+
+class SweepRequest(BaseModel):
     initial: float
-    term_months: int
+    terms: list[int] | None = None              # default: every term in truth.json's range
+    withdrawal_months: list[int] | None = None  # default: 0 .. max term - 1
+    amounts: list[float] | None = None          # default: 25/50/75/100% of initial
+    topups: list[TopUp] = []
+
+async def sweep_body(request: Request) -> SweepRequest:
+    # small bodies: plain pydantic validation, but msgpack is accepted like the other routes
+    try:
+        return SweepRequest.model_validate(await read_body(request))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+def _jsonable(values):
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        return np.where(np.isnan(values), None, values).tolist()
+    return values.tolist()
+
+def _check_axis(name: str, values, low, high=None):
+    """ 422 for an empty axis or its first value outside low..high (no upper bound when high is None). """
+    if not values:
+        raise HTTPException(status_code=422, detail=BodyError((name,), "must not be empty").detail())
+    for i, value in enumerate(values):
+        if value < low or (high is not None and value > high):
+            msg = f"must be between {low} and {high}" if high is not None else f"must be at least {low}"
+            raise HTTPException(status_code=422, detail=BodyError((name, i), msg).detail())
+
+@app.post("/simulate/sweep", openapi_extra=_documented_body(SweepRequest))
+@profiled
+def sweep(request: Request, req: SweepRequest = Depends(sweep_body)):
+    """
+    Whole what-if grid in one call: term × withdrawal month × amount for flex, term for
+    locked/main. Matrices are indexed [term][amount][month] (null where the month is past
+    the term), ready for a heatmap, with the best option per product.
+    """
+    truth = REGISTRY.get()
+    terms = req.terms if req.terms is not None else list(range(truth.min_months, truth.max_months + 1))
+    _check_axis("terms", terms, truth.min_months, truth.max_months)
+    months = req.withdrawal_months if req.withdrawal_months is not None else list(range(max(terms)))
+    _check_axis("withdrawal_months", months, 0, max(terms) - 1)
+    amounts = req.amounts if req.amounts is not None else [round(req.initial * q, 2) for q in (0.25, 0.5, 0.75, 1.0)]
+    _check_axis("amounts", amounts, 0)
+    if len(terms) * len(months) * len(amounts) * max(terms) > MAX_SWEEP_MONTHS:
+        raise HTTPException(status_code=400,
+                            detail=f"Sweep grid is limited to {MAX_SWEEP_MONTHS} simulated months (cells × longest term)")
+    out = simulate_sweep(req.initial, terms, months, amounts, truth.aprs["flex"],
+                         truth.aprs["locked"], truth.aprs["main"], req.topups)
+    return respond(request, {
+        "terms": _jsonable(out["terms"]),
+        "withdrawal_months": _jsonable(out["months"]),
+        "amounts": _jsonable(out["amounts"]),
+        "flex": {k: _jsonable(v) for k, v in out["flex"].items()},
+        "locked": {k: _jsonable(v) for k, v in out["locked"].items()},
+        "main": {k: _jsonable(v) for k, v in out["main"].items()},
+        "best": out["best"],
+        "best_flex_by_amount": out["best_flex_by_amount"],
+    })
+
+@app.get("/cache/stats")
+def cache_stats(): return SIM_CACHE.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """ Prometheus text exposition: route latency, calculator and advisor counters, cache stats. """
+    stats = SIM_CACHE.stats()
+    extra = (metrics.sample_lines("smartsaver_sim_cache_hits_total", "Simulation cache hits", stats["hits"], "counter")
+             + metrics.sample_lines("smartsaver_sim_cache_misses_total", "Simulation cache misses",
+                                    stats["misses"], "counter")
+             + metrics.sample_lines("smartsaver_sim_cache_size", "Entries in the simulation cache", stats["size"])
+             + metrics.sample_lines("smartsaver_truth_reloads_total", "truth.json loads (first load included)",
+                                    REGISTRY.reloads, "counter"))
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ---------- Batch ----------
+BATCH_CHUNK = 1000  # scenarios per chunk of the response
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+class BatchItem(FlexRequest):
+    product: Literal["flex", "locked", "main"]
+    id: str | int | None = None
+
+def _parse_item(raw) -> BatchItem:
+    """ One batch row (NDJSON line or decoded object) via the fast parser; raises ValueError. """
+    data = loads(raw) if isinstance(raw, (bytes, str)) else raw
+    fields = parse_flex(data)
+    product, id_ = data.get("product"), data.get("id")
+    if product not in BATCH_RUNNERS:
+        raise BodyError(("product",), f"must be one of {', '.join(BATCH_RUNNERS)}")
+    if id_ is not None and not isinstance(id_, (str, int)):
+        raise BodyError(("id",), "must be a string or integer")
+    return BatchItem.model_construct(product=product, id=id_, **fields)
+
+def _run_flex(items, output):
+    apr = REGISTRY.get().aprs["flex"]
+    results = [None] * len(items)
+    # a pass costs (scenarios × its longest term), so one long row must not set the term for the chunk
+    for group in flex_passes([it.term_months for it in items]):
+        part = [items[i] for i in group]
+        out = simulate_flex_batch(
+            [it.initial for it in part], [it.term_months for it in part], apr,
+            [it.topups for it in part], [it.withdrawals for it in part], schedule=output != "summary",
+        )
+        if output != "summary":
+            balances, interests = out["schedule"]["balance"].tolist(), out["schedule"]["interest"].tolist()
+        for r, (i, fb, ia) in enumerate(zip(group, out["final_balance"].tolist(), out["interest_accrued"].tolist())):
+            result = {"final_balance": fb, "interest_accrued": ia}
+            t = max(items[i].term_months, 0)
+            if output == "rows":
+                result["schedule"] = [{"month": m + 1, "balance": b, "interest": it}
+                                      for m, (b, it) in enumerate(zip(balances[r][:t], interests[r][:t]))]
+            elif output == "columnar":
+                result["schedule"] = {"month": list(range(1, t + 1)), "balance": balances[r][:t],
+                                      "interest": interests[r][:t]}
+            results[i] = result
+    return results
+
+def _run_simple(batch_fn, product):
+    def run(items, output):
+        out = batch_fn([it.initial for it in items], [it.term_months for it in items], REGISTRY.get().aprs[product])
+        return [{"final_balance": fb, "interest_accrued": ia}
+                for fb, ia in zip(out["final_balance"].tolist(), out["interest_accrued"].tolist())]
+    return run
+
+def _run_single(item: BatchItem, output: str):
+    apr = REGISTRY.get().aprs[item.product]
+    if item.product == "flex":
+        return simulate_cached("flex", item.initial, item.term_months, apr, item.topups, item.withdrawals, output)
+    return simulate_cached(item.product, item.initial, item.term_months, apr)
+
+BATCH_RUNNERS = {
+    "flex": _run_flex,
+    "locked": _run_simple(simulate_locked_batch, "locked"),
+    "main": _run_simple(simulate_main_batch, "main"),
+}
+
+@profiled
+def _run_batch(rows, output="rows"):
+    """
+    Validate and simulate one chunk of (index, raw item) rows, one vectorized pass per product.
+    Returns one output dict per row, in input order; bad rows carry an error instead of a result.
+    """
+    out = [None] * len(rows)
+    groups = {product: [] for product in BATCH_RUNNERS}
+    for k, (index, raw) in enumerate(rows):
+        try:
+            item = _parse_item(raw)
+        except ValueError as e:
+            out[k] = {"index": index, "error": str(e)}
+            continue
+        groups[item.product].append((k, index, item))
+
+    for product, members in groups.items():
+        if not members:
+            continue
+        items = [item for _, _, item in members]
+        try:
+            results = BATCH_RUNNERS[product](items, output)
+        except Exception:
+            # isolate the failing row(s) instead of failing the whole group
+            results = []
+            for item in items:
+                try:
+                    results.append(_run_single(item, output))
+                except Exception as e:
+                    results.append(e)
+        for (k, index, item), result in zip(members, results):
+            if isinstance(result, Exception):
+                out[k] = {"index": index, "id": item.id, "product": product, "error": str(result)}
+            else:
+                out[k] = {"index": index, "id": item.id, "product": product, "result": result}
+    return out
+
+def _ndjson_lines(body: bytes):
+    for line in body.split(b"\n"):
+        if line.strip():
+            yield line
+
+def _ndjson_line(out) -> bytes:
+    return dumps(out) + b"\n"
+
+def _stream_batch(rows, output, encode=_ndjson_line):
+    pending, index = [], 0
+    for raw in rows:
+        pending.append((index, raw))
+        index += 1
+        if len(pending) >= BATCH_CHUNK:
+            yield b"".join(encode(out) for out in _run_batch(pending, output))
+            pending = []
+    if pending:
+        yield b"".join(encode(out) for out in _run_batch(pending, output))
+
+@app.post("/simulate/batch", openapi_extra=_documented_body(BatchItem, array=True, ndjson=True))
+async def batch(request: Request, output: OutputMode = "rows"):
+    """
+    Simulate many mixed-product scenarios in one call.
+    Body is a JSON or msgpack list of items, or NDJSON (one item per line) with an NDJSON
+    content type. Each item is a flex request plus "product" and an optional "id". Results
+    stream back as NDJSON, one line per item with its input index and either "result" or
+    "error"; with Accept: application/msgpack they are a stream of msgpack objects instead.
+    """
+    # read up front: once the response starts streaming it owns the receive channel
+    if request.headers.get("content-type", "").startswith(NDJSON_TYPES):
+        rows = _ndjson_lines(await request.body())
+    else:
+        rows = await read_body(request)
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON or msgpack list, or NDJSON")
+    if wants_msgpack(request):
+        return StreamingResponse(_stream_batch(rows, output, pack), media_type=MSGPACK_TYPE)
+    return StreamingResponse(_stream_batch(rows, output), media_type="application/x-ndjson")
 
-@app.post("/simulate/locked")
-def locked(req: SimpleRequest):
-    apr = TRUTH["products"]["locked_vault_apr"]
-    return simulate_locked(req.initial, req.term_months, apr)
+def _openapi():
+    """ The generated spec plus the body models: no route declares them as a pydantic body. """
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        components = schema.setdefault("components", {}).setdefault("schemas", {})
+        for name, model in BODY_MODELS.items():
+            body = model.model_json_schema(ref_template="#/components/schemas/{model}")
+            components.update(body.pop("$defs", {}))
+            components[name] = body
+        app.openapi_schema = schema
+    return app.openapi_schema
 
-@app.post("/simulate/main")
-def main(req: SimpleRequest):
-    apr = TRUTH["products"]["main_account_apr"]
-    return simulate_main(req.initial, req.term_months, apr)
+app.openapi = _openapi
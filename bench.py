@@ -0,0 +1,347 @@
+# bench.py
+"""
+Benchmarks for the calculator, the API routes (in-process) and the advisor fallback.
+
+    python bench.py --save bench_baseline.json      # record a baseline
+    python bench.py --compare bench_baseline.json   # fail (exit 1) on regressions
+    python bench.py -k flex                         # only cases whose name contains "flex"
+    python bench.py --check                         # check the flex engines agree, then exit
+
+Each case is timed for at least --min-time seconds; the median and p95 per call are reported.
+--check runs simulate_flex, simulate_flex_batch and the original month loop over a grid of
+scenarios and fails (exit 1) if any final balance or interest total differs by even a cent.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Callable, Dict, List, Tuple
+
+from calculator import (simulate_flex, simulate_locked, simulate_main, simulate_flex_batch,
+                        simulate_sweep, flex_checkpoint, add_flex_events, resume_flex, TopUp, Withdrawal)
+from ledger import ledger_flex
+
+APR = 8.25
+
+def calculator_cases() -> List[Tuple[str, Callable]]:
+    cases = []
+    for term in (12, 24, 120, 360):
+        cases.append((f"calc.flex.term{term}", lambda t=term: simulate_flex(5000, t, APR)))
+    for n in (12, 120, 360):
+        topups = [TopUp(m, 100) for m in range(n)]
+        cases.append((f"calc.flex.topups{n}", lambda t=topups, n=n: simulate_flex(5000, n, APR, t)))
+        cases.append((f"calc.flex.topups{n}.summary",
+                      lambda t=topups, n=n: simulate_flex(5000, n, APR, t, output="summary")))
+    monthly = [TopUp(m, 100) for m in range(360)]
+    state = flex_checkpoint(5000, 360, APR, monthly, [Withdrawal(12, 500)], month=340)
+    cases.append(("calc.flex.resume.topups360",
+                  lambda: resume_flex(add_flex_events(state, [TopUp(350, 50)]), output="summary")))
+    for n in (1, 10, 100):
+        withdrawals = [Withdrawal(m % 24, 10) for m in range(n)]
+        cases.append((f"calc.flex.withdrawals{n}", lambda w=withdrawals: simulate_flex(5000, 24, APR, None, w)))
+    cases.append(("calc.locked", lambda: simulate_locked(5000, 12, 8.75)))
+    cases.append(("calc.main", lambda: simulate_main(5000, 12, 5.0)))
+    batch_w = [[Withdrawal(6, 2000)]] * 1000
+    cases.append(("calc.flex_batch.1k", lambda: simulate_flex_batch([5000.0] * 1000, [24] * 1000, APR, None, batch_w)))
+    cases.append(("calc.ledger_flex.1k", lambda: ledger_flex([5000.0] * 1000, [24] * 1000, APR, None, batch_w)))
+    cases.append(("calc.decimal_flex.1k", lambda: [_decimal_flex(5000, 24, APR, w) for w in batch_w]))
+    cases.append(("calc.sweep.default",
+                  lambda: simulate_sweep(5000, range(12, 25), range(24), [1250, 2500, 3750, 5000], APR, 8.75, 5.0)))
+    return cases
+
+def _decimal_flex(initial, term, apr, withdrawals):
+    """ Decimal version of the cents ledger (no top-ups), as a speed reference for ledger.py. """
+    cent, apr = Decimal("0.01"), Decimal(str(apr))
+    balance, accrued = Decimal(str(initial)), Decimal(0)
+    for m in range(term):
+        for w in withdrawals:
+            if w.month == m:
+                balance -= min(Decimal(str(w.amount)), balance)
+        accrued += (balance * apr / 1200).quantize(cent, ROUND_HALF_EVEN)
+    return balance, accrued
+
+def _baseline_flex(initial, term, apr, topups, withdrawals):
+    """ The original month-by-month simulate_flex, kept as the reference for --check. """
+    chunks = {0: initial}
+    for t in topups:
+        chunks[t.month] = chunks.get(t.month, 0) + t.amount
+    accrued, balance = 0.0, initial
+    for m in range(term):
+        for w in [w for w in withdrawals if w.month == m]:
+            remaining = min(w.amount, balance)
+            balance -= remaining
+            for cm in sorted(chunks.keys()):
+                if remaining <= 0:
+                    break
+                take = min(chunks[cm], remaining)
+                chunks[cm] -= take
+                remaining -= take
+        balance = sum([amt for amt in chunks.values()])
+        month_int = 0.0
+        for cm, amt in chunks.items():
+            if cm <= m and amt > 0:
+                month_int += amt * (apr / 100.0) / 12.0
+        accrued += month_int
+    return round(balance, 2), round(accrued, 2)
+
+# scenarios that once made the engines disagree: (initial, term, apr, topups, withdrawals)
+FLEX_REGRESSIONS = [
+    (2020.57, 29, APR, [], [Withdrawal(0, 8524.95), Withdrawal(26, 9662.21)]),
+    (13600.11, 13, 8.75, [TopUp(2, 687.72), TopUp(12, 2702.34)],
+     [Withdrawal(7, 4747.96), Withdrawal(12, 2368.59), Withdrawal(7, 4855.39)]),
+    (11420.16, 3, APR, [TopUp(0, 1707.74), TopUp(4, 1950.06), TopUp(4, 2568.67), TopUp(1, 1779.46)],
+     [Withdrawal(0, 4809.08), Withdrawal(1, 2685.69)]),
+    (2163.28, 36, APR, [TopUp(32, 708.62), TopUp(2, 929.7)], []),
+]
+
+def check_flex(seed: int = 0) -> List[str]:
+    """ Scenarios where simulate_flex, simulate_flex_batch and _baseline_flex disagree: whole-euro
+    plans, then random ones with cent amounts, top-ups in any order (some past the term or in the
+    same month) and withdrawals, then FLEX_REGRESSIONS.
+    """
+    rng = random.Random(seed)
+    scenarios = [(float(a), t, apr, [], []) for apr in (APR, 3.0) for t in (7, 12, 18, 24)
+                 for a in range(100, 2001)]
+    cents = lambda high: round(rng.uniform(1, high), rng.choice((0, 2)))
+    for _ in range(6000):
+        term = rng.randint(1, 36)
+        topups = [TopUp(rng.randrange(term + 3), cents(3000)) for _ in range(rng.randint(0, 5))]
+        withdrawals = [Withdrawal(rng.randrange(term), cents(8000)) for _ in range(rng.randint(0, 3))]
+        scenarios.append((cents(20000), term, rng.choice((APR, 3.0, 5.0, 8.75)), topups, withdrawals))
+    scenarios += FLEX_REGRESSIONS
+    mismatches = []
+    for apr in sorted({s[2] for s in scenarios}):
+        group = [s for s in scenarios if s[2] == apr]
+        batch = simulate_flex_batch([s[0] for s in group], [s[1] for s in group], apr,
+                                    [s[3] for s in group], [s[4] for s in group])
+        for i, (initial, term, _, topups, withdrawals) in enumerate(group):
+            scalar = simulate_flex(initial, term, apr, topups, withdrawals, output="summary")
+            results = {
+                "baseline": _baseline_flex(initial, term, apr, topups, withdrawals),
+                "scalar": (scalar["final_balance"], scalar["interest_accrued"]),
+                "batch": (float(batch["final_balance"][i]), float(batch["interest_accrued"][i])),
+            }
+            if len(set(results.values())) > 1:
+                mismatches.append(f"€{initial:g} {term}m {apr}% topups={topups} withdrawals={withdrawals}: {results}")
+    return mismatches
+
+def api_cases() -> List[Tuple[str, Callable]]:
+    from fastapi.testclient import TestClient
+    from app import app
+    from cache import SIM_CACHE
+
+    client = TestClient(app)
+    flex_body = {"initial": 5000, "term_months": 12, "withdrawals": [{"month": 6, "amount": 2000}]}
+    simple_body = {"initial": 5000, "term_months": 12}
+    batch_body = [dict(flex_body, product=p) for p in ("flex", "locked", "main")] * 34
+
+    def cold(path, body):
+        # clear the simulation cache so the calculator runs on every call
+        def run():
+            SIM_CACHE.clear()
+            client.post(path, json=body).raise_for_status()
+        return run
+
+    def warm(path, body):
+        return lambda: client.post(path, json=body).raise_for_status()
+
+    # 30-year flex plan with monthly top-ups and quarterly withdrawals: large body, large response
+    big_body = {"initial": 5000, "term_months": 360, "topups": [{"month": m, "amount": 50} for m in range(1, 360)],
+                "withdrawals": [{"month": m, "amount": 20} for m in range(6, 360, 3)]}
+    msgpack_headers = {"content-type": "application/msgpack", "accept": "application/msgpack"}
+
+    def warm_msgpack(path, body):
+        import msgpack
+        packed = msgpack.packb(body)
+        return lambda: client.post(path, content=packed, headers=msgpack_headers).raise_for_status()
+
+    return [
+        ("api.truth", lambda: client.get("/truth").raise_for_status()),
+        ("api.flex.cold", cold("/simulate/flex", flex_body)),
+        ("api.flex.cached", warm("/simulate/flex", flex_body)),
+        ("api.flex.summary", cold("/simulate/flex?output=summary", flex_body)),
+        ("api.flex.term360.json", warm("/simulate/flex", big_body)),
+        ("api.flex.term360.msgpack", warm_msgpack("/simulate/flex", big_body)),
+        ("api.locked", cold("/simulate/locked", simple_body)),
+        ("api.main", cold("/simulate/main", simple_body)),
+        ("api.compare", cold("/simulate/compare", flex_body)),
+        ("api.batch.102", warm("/simulate/batch", batch_body)),
+        ("api.sweep", warm("/simulate/sweep", {"initial": 5000})),
+    ]
+
+def codec_cases() -> List[Tuple[str, Callable]]:
+    """ Per-request serialization and body parsing: FastAPI defaults vs codec.py. """
+    import msgpack
+    from fastapi.encoders import jsonable_encoder
+    from app import FlexRequest
+    from codec import dumps, loads, parse_flex
+
+    topups = [TopUp(m, 50) for m in range(1, 360)]
+    result = simulate_flex(5000, 360, APR, topups, [Withdrawal(m, 20) for m in range(6, 360, 3)])
+    body = json.dumps({"initial": 5000, "term_months": 360,
+                       "topups": [{"month": m, "amount": 50} for m in range(1, 360)],
+                       "withdrawals": [{"month": m, "amount": 20} for m in range(6, 360, 3)]}).encode()
+    packed = msgpack.packb({"initial": 5000, "term_months": 360, "topups": [[m, 50] for m in range(1, 360)],
+                            "withdrawals": [[m, 20] for m in range(6, 360, 3)]})
+    return [
+        ("codec.encode.rows360.fastapi", lambda: json.dumps(jsonable_encoder(result)).encode()),
+        ("codec.encode.rows360.orjson", lambda: dumps(result)),
+        ("codec.encode.rows360.msgpack", lambda: msgpack.packb(result)),
+        ("codec.parse.flex480.pydantic", lambda: FlexRequest.model_validate_json(body)),
+        ("codec.parse.flex480.fast", lambda: FlexRequest.model_construct(**parse_flex(loads(body)))),
+        ("codec.parse.flex480.msgpack_pairs", lambda: FlexRequest.model_construct(**parse_flex(msgpack.unpackb(packed)))),
+    ]
+
+def advisor_cases() -> List[Tuple[str, Callable]]:
+    import advisor
+    from cache import SIM_CACHE
+    from scheduler import CallScheduler
+    from sessions import SessionStore
+
+    def fallback(msg):
+        def run():
+            SIM_CACHE.clear()
+            advisor._fallback_reply(msg)
+        return run
+
+    # the session grows on every call; the per-turn cost should not. It runs on a private
+    # in-memory store with the scripted reply, so no API call or session DB write is made
+    store = SessionStore()
+
+    def session_turn():
+        saved = advisor.SESSIONS, advisor.USE_OPENAI
+        advisor.SESSIONS, advisor.USE_OPENAI = store, False
+        try:
+            advisor.chat_session("bench", "tell me more about the flex vault please")
+        finally:
+            advisor.SESSIONS, advisor.USE_OPENAI = saved
+
+    # admission, single-flight bookkeeping and release around a no-op request
+    scheduler = CallScheduler()
+    return [
+        ("advisor.fallback.amount", fallback("I want to invest €5,000 for a year")),
+        ("advisor.fallback.no_amount", fallback("hello there")),
+        ("advisor.session.turn", session_turn),
+        ("advisor.scheduler.call", lambda: scheduler.call(lambda timeout: None, "bench")),
+    ]
+
+def parser_cases() -> List[Tuple[str, Callable]]:
+    from parsers import parse_float, parse_term, parse_bool, parse_withdraw, parse_goal, extract
+    return [
+        ("parsers.float", lambda: parse_float("€5,000")),
+        ("parsers.term", lambda: parse_term("18")),
+        ("parsers.bool", lambda: parse_bool("Yes")),
+        ("parsers.withdraw", lambda: parse_withdraw("2000 in month 6")),
+        ("parsers.goal", lambda: parse_goal("saving for a wedding next year")),
+        ("parsers.extract", lambda: extract("invest €5,000 for 18 months, add 100 monthly, withdraw 1500 in month 8")),
+    ]
+
+def startup_cases() -> List[Tuple[str, Callable]]:
+    """ Import time of each entry point in a fresh interpreter, i.e. what a new worker or container pays. """
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def cold(module):
+        return lambda: subprocess.run([sys.executable, "-c", f"import {module}"], cwd=here, check=True)
+
+    return [
+        ("startup.app", cold("app")),
+        ("startup.advisor", cold("advisor")),
+        ("startup.client", cold("client")),
+    ]
+
+def measure(fn: Callable, min_time: float) -> Dict:
+    fn()  # warm-up
+    # batch calls so very fast cases are not dominated by timer overhead
+    inner, elapsed = 1, 0.0
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= 0.01 or inner >= 1 << 16:
+            break
+        inner *= 4
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while time.perf_counter() < deadline or len(samples) < 5:
+        t0 = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        samples.append((time.perf_counter() - t0) / inner)
+    samples.sort()
+    return {
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "p95_us": round(samples[int(0.95 * (len(samples) - 1))] * 1e6, 3),
+        "calls": len(samples) * inner,
+    }
+
+def run(filter_: str = "", min_time: float = 0.5) -> Dict:
+    results = {}
+    for group in (calculator_cases, parser_cases, advisor_cases, codec_cases, api_cases, startup_cases):
+        for name, fn in group():
+            if filter_ and filter_ not in name:
+                continue
+            results[name] = measure(fn, min_time)
+            print(f"{name:36s} {results[name]['median_us']:12.2f} us  (p95 {results[name]['p95_us']:.2f})")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """ Names of cases whose median got slower than baseline by more than tolerance. """
+    regressions = []
+    for name, res in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        ratio = res["median_us"] / base["median_us"] if base["median_us"] else 1.0
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:36s} {base['median_us']:12.2f} -> {res['median_us']:12.2f} us  x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio (default 0.25)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to time each case")
+    parser.add_argument("-k", dest="filter", default="", help="only run cases containing this text")
+    parser.add_argument("--check", action="store_true", help="check the flex engines agree and exit")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatches = check_flex()
+        for line in mismatches[:20]:
+            print(line)
+        print(f"{len(mismatches)} flex mismatch(es)")
+        return 1 if mismatches else 0
+
+    current = run(args.filter, args.min_time)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
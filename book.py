@@ -0,0 +1,256 @@
+# book.py
+"""
+Simulate a whole customer book offline and aggregate it per product and month.
+
+    python book.py accounts.csv --topups topups.csv --withdrawals withdrawals.csv \\
+        --out results.csv --aggregate by_month.csv --workers 8
+
+Inputs are CSV or Parquet (by extension) and are read in --chunk-size row chunks:
+    accounts:    account_id, product (flex|locked|main), initial, term_months
+    topups:      account_id, month, amount
+    withdrawals: account_id, month, amount
+All three must be sorted by account_id, so events can be streamed alongside their accounts.
+Chunks are simulated on a process pool with a bounded number in flight, per-account results
+are appended to --out as chunks finish (in input order), and the per product/month totals
+are written to --aggregate at the end, so memory stays flat however large the book is.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from calculator import flex_passes, simulate_flex_batch, simulate_locked_batch, simulate_main_batch
+from registry import REGISTRY, TRUTH_PATH, TruthError, TruthRegistry
+
+PRODUCTS = ("flex", "locked", "main")
+ACCOUNT_COLUMNS = ("account_id", "product", "initial", "term_months")
+EVENT_COLUMNS = ("account_id", "month", "amount")
+
+def read_chunks(path: str, chunk_size: int, columns) -> Iterator[pd.DataFrame]:
+    """ DataFrame chunks of a CSV or Parquet file. """
+    if path.endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq  # only needed for Parquet input
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=list(columns)):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=list(columns))
+
+class SortedEvents:
+    """ Streams an events file sorted by account_id, handing out the rows for each account chunk. """
+    def __init__(self, chunks: Optional[Iterator[pd.DataFrame]]):
+        self._chunks = chunks
+        self._carry = pd.DataFrame(columns=list(EVENT_COLUMNS))
+        self._last = None
+
+    def _next_chunk(self) -> Optional[pd.DataFrame]:
+        chunk = next(self._chunks, None) if self._chunks is not None else None
+        if chunk is not None and len(chunk):
+            ids = chunk["account_id"]
+            if not ids.is_monotonic_increasing or (self._last is not None and ids.iloc[0] < self._last):
+                raise ValueError("event files must be sorted by account_id")
+            self._last = ids.iloc[-1]
+        return chunk
+
+    def take_until(self, last_id) -> pd.DataFrame:
+        """ All remaining rows with account_id <= last_id. """
+        parts = [self._carry]
+        while not len(parts[-1]) or parts[-1]["account_id"].iloc[-1] <= last_id:
+            chunk = self._next_chunk()
+            if chunk is None:
+                break
+            parts.append(chunk)
+        df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        upto = int(np.searchsorted(df["account_id"].to_numpy(), last_id, side="right")) if len(df) else 0
+        self._carry = df.iloc[upto:]
+        return df.iloc[:upto]
+
+def _event_lists(ids: np.ndarray, events: pd.DataFrame):
+    """ Per-account lists of event rows (namedtuples with .month / .amount) in ids order. """
+    lists = [[] for _ in range(len(ids))]
+    if len(events):
+        pos = pd.Series(np.arange(len(ids)), index=ids)
+        at = pos.reindex(events["account_id"].to_numpy()).to_numpy()
+        for p, row in zip(at, events.itertuples(index=False)):
+            if not np.isnan(p):
+                lists[int(p)].append(row)
+    return lists
+
+def _monthly_totals(values: np.ndarray) -> Dict[str, list]:
+    return {"balance": np.nansum(values[0], axis=0).tolist(), "interest": np.nansum(values[1], axis=0).tolist(),
+            "accounts": (~np.isnan(values[0])).sum(axis=0).tolist()}
+
+def simulate_chunk(accounts: pd.DataFrame, topups: pd.DataFrame, withdrawals: pd.DataFrame, aprs: Dict[str, float]):
+    """
+    Worker: simulate one chunk of accounts, grouped into one vectorized pass per product.
+    Returns (per-account results DataFrame, {product: monthly totals}).
+    """
+    unknown = set(accounts["product"].unique()) - set(PRODUCTS)
+    if unknown:
+        raise ValueError(f"unknown product(s) {sorted(unknown)}; expected one of {PRODUCTS}")
+    results, monthly = [], {}
+    for product in PRODUCTS:
+        acc = accounts[accounts["product"] == product]
+        if not len(acc):
+            continue
+        initials = acc["initial"].to_numpy(dtype=np.float64)
+        terms = acc["term_months"].to_numpy(dtype=np.int64)
+        if product == "flex":
+            ids = acc["account_id"].to_numpy()
+            tops, wds = _event_lists(ids, topups), _event_lists(ids, withdrawals)
+            out = {"final_balance": np.empty(len(acc)), "interest_accrued": np.empty(len(acc))}
+            # term-bounded passes: the schedule is scenarios × longest term, so one long account
+            # must not size it for the whole chunk
+            for group in flex_passes(terms):
+                part = simulate_flex_batch(initials[group], terms[group], aprs[product],
+                                           [tops[i] for i in group], [wds[i] for i in group])
+                out["final_balance"][group] = part["final_balance"]
+                out["interest_accrued"][group] = part["interest_accrued"]
+                schedule = part["schedule"]
+                _merge_monthly(monthly, {product: _monthly_totals((schedule["balance"], schedule["interest"]))})
+        else:
+            batch_fn = simulate_locked_batch if product == "locked" else simulate_main_batch
+            out = batch_fn(initials, terms, aprs[product])
+            # every month of the term has the same balance and interest: count accounts per term
+            t = np.maximum(terms, 0)
+            monthly_int = initials * (aprs[product] / 100.0) / 12.0
+            by_term = lambda w: np.cumsum(np.bincount(t, weights=w, minlength=1)[::-1])[::-1][1:]
+            monthly[product] = {"balance": by_term(initials).tolist(), "interest": by_term(monthly_int).tolist(),
+                                "accounts": by_term(np.ones(len(t))).astype(int).tolist()}
+        results.append(pd.DataFrame({"account_id": acc["account_id"].to_numpy(), "product": product,
+                                     "final_balance": out["final_balance"], "interest_accrued": out["interest_accrued"]},
+                                    index=acc.index))
+    # back to input order
+    frame = pd.concat(results).sort_index().reset_index(drop=True)
+    return frame, monthly
+
+def _merge_monthly(into: Dict[str, Dict[str, np.ndarray]], monthly: Dict[str, Dict[str, list]]):
+    for product, cols in monthly.items():
+        agg = into.setdefault(product, {k: np.zeros(0) for k in cols})
+        for key, values in cols.items():
+            values = np.asarray(values, dtype=np.float64)
+            if len(values) > len(agg[key]):
+                agg[key] = np.pad(agg[key], (0, len(values) - len(agg[key])))
+            agg[key][:len(values)] += values
+
+class ResultWriter:
+    """ Appends per-account result chunks to CSV or Parquet as they complete. """
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._parquet = None
+        self._header = True
+
+    def write(self, frame: pd.DataFrame):
+        if not self.path or not len(frame):
+            return
+        if self.path.endswith((".parquet", ".pq")):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            frame.to_csv(self.path, mode="w" if self._header else "a", header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+def run_book(accounts_path: str, topups_path: str = None, withdrawals_path: str = None, out_path: str = None,
+             aggregate_path: str = None, aprs: Dict[str, float] = None, workers: int = None,
+             chunk_size: int = 50_000, terms: Tuple[int, int] = None) -> Dict:
+    """
+    Simulate every account in accounts_path; see the module docstring for file layouts.
+    aprs and terms (the allowed (min, max) term_months) default to the shared truth config
+    (registry.REGISTRY); an account outside the term range raises ValueError before it is simulated.
+    Returns book totals per product ({accounts, final_balance, interest_accrued}) plus timing.
+    """
+    workers = workers or os.cpu_count() or 1
+    if aprs is None or terms is None:
+        truth = REGISTRY.get()
+        aprs = aprs or truth.aprs
+        terms = terms or (truth.min_months, truth.max_months)
+    topups = SortedEvents(read_chunks(topups_path, chunk_size, EVENT_COLUMNS) if topups_path else None)
+    withdrawals = SortedEvents(read_chunks(withdrawals_path, chunk_size, EVENT_COLUMNS) if withdrawals_path else None)
+    writer = ResultWriter(out_path)
+    monthly: Dict[str, Dict[str, np.ndarray]] = {}
+    totals = {p: {"accounts": 0, "final_balance": 0.0, "interest_accrued": 0.0} for p in PRODUCTS}
+    start = time.perf_counter()
+
+    def collect(future):
+        frame, chunk_monthly = future.result()
+        writer.write(frame)
+        _merge_monthly(monthly, chunk_monthly)
+        for product, group in frame.groupby("product"):
+            totals[product]["accounts"] += len(group)
+            totals[product]["final_balance"] += float(group["final_balance"].sum())
+            totals[product]["interest_accrued"] += float(group["interest_accrued"].sum())
+
+    last_id = None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for accounts in read_chunks(accounts_path, chunk_size, ACCOUNT_COLUMNS):
+            if not len(accounts):
+                continue
+            ids = accounts["account_id"]
+            if not ids.is_monotonic_increasing or (last_id is not None and ids.iloc[0] < last_id):
+                raise ValueError("accounts must be sorted by account_id")
+            last_id = ids.iloc[-1]
+            bad = accounts[~accounts["term_months"].between(*terms)]
+            if len(bad):
+                raise ValueError(f"account {bad['account_id'].iloc[0]}: term_months {bad['term_months'].iloc[0]} "
+                                 f"outside {terms[0]}..{terms[1]}")
+            pending.append(pool.submit(simulate_chunk, accounts, topups.take_until(last_id),
+                                       withdrawals.take_until(last_id), aprs))
+            # bounded in-flight work keeps memory flat; results are written in input order
+            while len(pending) >= 2 * workers:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+    writer.close()
+
+    if aggregate_path:
+        rows = [{"product": product, "month": m + 1, "accounts": int(cols["accounts"][m]),
+                 "balance": round(float(cols["balance"][m]), 2), "interest": round(float(cols["interest"][m]), 2)}
+                for product, cols in monthly.items() for m in range(len(cols["balance"]))]
+        pd.DataFrame(rows, columns=["product", "month", "accounts", "balance", "interest"]).to_csv(aggregate_path, index=False)
+
+    for t in totals.values():
+        t["final_balance"] = round(t["final_balance"], 2)
+        t["interest_accrued"] = round(t["interest_accrued"], 2)
+    elapsed = time.perf_counter() - start
+    accounts_total = sum(t["accounts"] for t in totals.values())
+    return {"products": totals, "accounts": accounts_total, "seconds": round(elapsed, 3),
+            "accounts_per_s": round(accounts_total / elapsed, 1) if elapsed else 0.0}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("accounts", help="accounts CSV/Parquet, sorted by account_id")
+    parser.add_argument("--topups", help="top-ups CSV/Parquet, sorted by account_id")
+    parser.add_argument("--withdrawals", help="withdrawals CSV/Parquet, sorted by account_id")
+    parser.add_argument("--out", help="per-account results (.csv or .parquet), written incrementally")
+    parser.add_argument("--aggregate", help="per product/month totals CSV")
+    parser.add_argument("--truth", default=TRUTH_PATH, help="truth.json with product APRs and term range")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="accounts per chunk")
+    args = parser.parse_args(argv)
+
+    try:
+        truth = TruthRegistry(args.truth).get()
+    except TruthError as e:
+        parser.error(str(e))
+    summary = run_book(args.accounts, args.topups, args.withdrawals, args.out, args.aggregate,
+                       truth.aprs, args.workers, args.chunk_size, (truth.min_months, truth.max_months))
+    print(json.dumps(summary, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
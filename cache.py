@@ -0,0 +1,200 @@
+# cache.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+from calculator import simulate_flex, simulate_locked, simulate_main, TopUp, Withdrawal
+from rates import RateTables, truth_version
+from registry import REGISTRY
+
+SIMULATORS = {"flex": simulate_flex, "locked": simulate_locked, "main": simulate_main}
+
+class SimulationCache:
+    """
+    Bounded LRU cache with a per-entry TTL for calculator results.
+    Entries are dropped when the truth config they were computed under changes.
+    Cached results are shared between callers, so treat them as read-only.
+    """
+    def __init__(self, maxsize: int = 4096, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_truth(self, truth: Dict):
+        """ Record the truth config in use; clears the cache if it differs from the last one. """
+        version = truth_version(truth)
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "truth_version": self.version,
+            }
+
+SIM_CACHE = SimulationCache(
+    maxsize=int(os.getenv("SIM_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("SIM_CACHE_TTL", "600")),
+)
+
+RATE_TABLES: Optional[RateTables] = None
+
+def use_truth(truth: Dict):
+    """ Point the shared cache and rate tables at truth; both reset only when it changed. """
+    global RATE_TABLES
+    SIM_CACHE.set_truth(truth)
+    if RATE_TABLES is None or RATE_TABLES.version != SIM_CACHE.version:
+        RATE_TABLES = RateTables(truth)
+
+# every truth.json (re)load resets the cache and rate tables of processes that simulate
+REGISTRY.subscribe(lambda truth: use_truth(truth.config))
+
+def _events(events) -> tuple:
+    # same-month withdrawals drain the same total in any order, so sorting is safe
+    return tuple(sorted((int(e.month), float(e.amount)) for e in events or []))
+
+def canonical_key(product: str, initial: float, term_months: int, apr: float,
+                  topups: List[TopUp] = None, withdrawals: List[Withdrawal] = None,
+                  output: str = "rows") -> tuple:
+    """ Hashable key for a scenario; products without events ignore top-ups/withdrawals. """
+    if product != "flex":
+        return (product, float(initial), int(term_months), float(apr))
+    return (product, float(initial), int(term_months), float(apr), _events(topups), _events(withdrawals),
+            output)
+
+def simulate_cached(product: str, initial: float, term_months: int, apr: float,
+                    topups: List[TopUp] = None, withdrawals: List[Withdrawal] = None,
+                    output: str = "rows", cache: SimulationCache = SIM_CACHE) -> Dict:
+    """
+    Run the calculator for product ("flex", "locked" or "main") through the cache.
+    Misses are answered from the rate tables when possible, else by calculator.py.
+    Returns:
+        Dict as returned by the matching simulate_* function
+    """
+    key = canonical_key(product, initial, term_months, apr, topups, withdrawals, output)
+    result = cache.get(key)
+    if result is None:
+        if RATE_TABLES is not None:
+            result = RATE_TABLES.simulate(product, initial, term_months, apr, topups, withdrawals, output)
+        if result is None and product == "flex":
+            result = simulate_flex(initial, term_months, apr, topups, withdrawals, output)
+        elif result is None:
+            result = SIMULATORS[product](initial, term_months, apr)
+        cache.put(key, result)
+    return result
+
+class ResponseCache:
+    """
+    Disk-backed (SQLite) cache of advisor replies, shared across processes and restarts.
+    Keys are conversation digests; each entry records the truth version it was produced
+    under, and set_truth() drops entries from any other version. Once the stored replies
+    exceed max_bytes the least recently used ones are evicted.
+    """
+    def __init__(self, path: str, max_bytes: int = 64 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS replies (key TEXT PRIMARY KEY, version TEXT NOT NULL, "
+                         "value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS replies_used ON replies (used)")
+
+    def set_truth(self, version: str):
+        """ Use truth version from now on; entries stored under any other version are deleted. """
+        with self._lock:
+            if version != self.version:
+                self._db.execute("DELETE FROM replies WHERE version != ?", (version,))
+                self.version = version
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM replies WHERE key = ? AND version = ?",
+                                   (key, self.version)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE replies SET used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict):
+        data = json.dumps(value)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO replies VALUES (?, ?, ?, ?, ?)",
+                             (key, self.version, data, len(data.encode()), time.time()))
+            self._evict()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM replies ORDER BY used").fetchall():
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM replies WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM replies")
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size, nbytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM replies").fetchone()
+            total = self.hits + self.misses
+            return {
+                "size": size,
+                "bytes": nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "truth_version": self.version,
+            }
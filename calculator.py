@@ -1,6 +1,11 @@
 # calculator.py
-from dataclasses import dataclass
-from typing import List, Dict
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Dict, Sequence
+
+import numpy as np
+
+from metrics import FLEX_SECONDS, FLEX_MONTHS, FLEX_EVENTS, FLEX_BATCH_SCENARIOS
 
 @dataclass
 class TopUp:
@@ -12,59 +17,243 @@ class Withdrawal:
     month: int
     amount: float
 
+# schedule formats: per-month dicts, totals only, or parallel month/balance/interest arrays
+OUTPUT_MODES = ("rows", "summary", "columnar")
+
 def monthly_interest(amount: float, apr: float) -> float:
     return amount * (apr/100.0) / 12.0
 
-def simulate_flex(initial: float, term_months: int, apr: float, topups: List[TopUp] = None, withdrawals: List[Withdrawal] = None,) -> Dict:
-    """ Simulate a flex vault with monthly accrual, top-ups, and withdrawals.
-    Args:
-        initial: initial amount deposited
-        term_months: total term in months to simulate
-        apr: annual percentage rate (e.g. 5.0 for 5%)
-        topups: list of TopUp instances
-        withdrawals: list of Withdrawal instances
-    Returns:
-        Dict with final_balance, interest_accrued, schedule (list of month, balance, interest)
+@dataclass
+class FlexState:
+    """ Resumable simulate_flex state at the start of event month `month` (see flex_checkpoint).
+    Only what the months before the cursor changed is kept: accrued interest and the remaining
+    amount of every chunk withdrawals drew on; everything else is rebuilt from the event lists
+    when resuming, with the same float operations as a full run.
+    """
+    initial: float
+    term_months: int
+    apr: float
+    topups: List[TopUp]
+    withdrawals: List[Withdrawal]
+    month: int = 0                 # months before this are simulated
+    accrued: float = 0.0
+    chunks: Dict[int, float] = field(default_factory=dict)  # remaining amount of every chunk drawn on
+    drained_to: int = -1           # latest chunk month a withdrawal has drawn on
+    capped: bool = False           # a withdrawal was limited by the balance
+
+    def to_dict(self) -> Dict:
+        """ Compact JSON-serializable form (floats round-trip exactly through json). """
+        return {
+            "initial": self.initial, "term_months": self.term_months, "apr": self.apr,
+            "topups": [[t.month, t.amount] for t in self.topups],
+            "withdrawals": [[w.month, w.amount] for w in self.withdrawals],
+            "month": self.month, "accrued": self.accrued,
+            "chunks": [[cm, amt] for cm, amt in self.chunks.items()],
+            "drained_to": self.drained_to, "capped": self.capped,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FlexState":
+        return cls(
+            initial=data["initial"], term_months=data["term_months"], apr=data["apr"],
+            topups=[TopUp(m, a) for m, a in data["topups"]],
+            withdrawals=[Withdrawal(m, a) for m, a in data["withdrawals"]],
+            month=data["month"], accrued=data["accrued"],
+            chunks={int(cm): amt for cm, amt in data["chunks"]},
+            drained_to=data["drained_to"], capped=data["capped"],
+        )
+
+def _refold(sums: List[float], values: List[float], start: int, stop: int):
+    """ sums[i + 1] = sums[i] + values[i] for start <= i < stop: a left-to-right sum kept as prefixes. """
+    for i in range(start, stop):
+        sums[i + 1] = sums[i] + values[i]
+
+def _flex_segments(initial: float, term_months: int, apr: float, topups: List[TopUp], withdrawals: List[Withdrawal],
+                   resume: FlexState = None, stop: FlexState = None):
+    """ Event engine behind simulate_flex, iter_flex and the checkpoint/resume API.
+    Balances only change at event months (month 0, top-ups, withdrawals), so the term is walked
+    event by event. The balance and the monthly interest are sums over the chunks in the order
+    they were added, chunk by chunk as in the original month loop, so they round the same; they
+    are kept as prefix sums and re-added only from the first chunk that changed. Yields one
+    tuple per segment: (first month, next event month, balance, monthly interest, withdrawals applied).
+    resume starts from a FlexState instead of month 0; stop (a FlexState whose month is the
+    requested cursor) ends the walk at the last event month at or before it and fills stop in.
     """
-    topups = topups or []
-    withdrawals = withdrawals or []
     # track “chunks” by month added
     chunks = {0: initial}
     for t in topups:
         chunks[t.month] = chunks.get(t.month, 0) + t.amount
+    order = sorted(chunks)
+    head = 0     # chunks before this index (in month order) are drained
+    started = 0  # chunks before this index (in month order) earn interest
+
+    # index events by month; only months inside the term matter
+    withdrawals_by_month = {}
+    for w in withdrawals:
+        if 0 <= w.month < term_months:
+            withdrawals_by_month.setdefault(w.month, []).append(w)
+    events = sorted({0, *withdrawals_by_month, *(cm for cm in chunks if 0 < cm < term_months)})
+    if term_months <= 0:
+        return
 
-    # simulate month by month with simple accrual
-    accrued = 0.0
     balance = initial
-    schedule = []
-    for m in range(term_months):
-        # apply withdrawals first in month m
-        for w in [w for w in withdrawals if w.month == m]:
+    if resume is not None:
+        # replay the drains before the cursor; untouched chunks are as freshly built
+        chunks.update(resume.chunks)
+        events = [m for m in events if m >= resume.month]
+    # per chunk, in the order added: amount and monthly interest (0 until it earns)
+    slot = {cm: i for i, cm in enumerate(chunks)}
+    amounts = list(chunks.values())
+    interest = [0.0] * len(amounts)
+    earning_to = 0  # slots from here on have never earned: 0.0 interest, nothing to add
+    amount_sums, interest_sums = [0.0] * (len(amounts) + 1), [0.0] * (len(amounts) + 1)
+    _refold(amount_sums, amounts, 0, len(amounts))
+    if resume is not None and resume.month > 0:
+        balance = amount_sums[-1]
+    log = [] if stop is not None else None
+    for i, m in enumerate(events):
+        nxt = events[i + 1] if i + 1 < len(events) else term_months
+        if log is not None and (nxt > stop.month or i + 1 == len(events)):
+            break
+        changed = len(amounts)  # first chunk slot whose amount or interest changed this month
+        # apply withdrawals first in month m, oldest chunks first
+        applied = withdrawals_by_month.get(m, ())
+        for w in applied:
             withdraw_amt = min(w.amount, balance)
+            if log is not None and withdraw_amt < w.amount:
+                stop.capped = True
             balance -= withdraw_amt
-            # remove proportionally from chunks
             remaining = withdraw_amt
-            for cm in sorted(chunks.keys()):
+            for j in range(head, len(order)):
                 if remaining <= 0: break
-                take = min(chunks[cm], remaining)
-                chunks[cm] -= take
+                cm = order[j]
+                amt = chunks[cm]
+                take = min(amt, remaining)
+                chunks[cm] = amt - take
                 remaining -= take
-        # apply top-ups at month m (already in chunks dict)
-        balance = sum([amt for amt in chunks.values()])
-
-        # interest this month across all active chunks
-        month_int = 0.0
-        for cm, amt in chunks.items():
-            if cm <= m and amt > 0:
-                month_int += monthly_interest(amt, apr)
-        accrued += month_int
-        schedule.append({"month": m+1, "balance": round(balance,2), "interest": round(month_int,2)})
+                if log is not None:
+                    log.append(cm)
+                k = slot[cm]
+                amounts[k] = chunks[cm]
+                if j < started:
+                    interest[k] = monthly_interest(chunks[cm], apr) if chunks[cm] > 0 else 0.0
+                changed = min(changed, k)
+            while head < len(order) and chunks[order[head]] == 0:
+                head += 1
+        if changed < len(amounts):
+            _refold(amount_sums, amounts, changed, len(amounts))
+        # chunks added up to month m start earning (already counted in balance)
+        while started < len(order) and order[started] <= m:
+            cm = order[started]
+            k = slot[cm]
+            interest[k] = monthly_interest(chunks[cm], apr) if chunks[cm] > 0 else 0.0
+            changed = min(changed, k, earning_to)  # slots up to k were never added: add them now
+            earning_to = max(earning_to, k + 1)
+            started += 1
+        if changed < earning_to:
+            _refold(interest_sums, interest, changed, earning_to)
+        balance = amount_sums[-1]
 
-    return {
+        # interest is flat until the next event
+        yield m, nxt, balance, interest_sums[earning_to], len(applied)
+    if log is not None:
+        stop.month = m
+        stop.chunks = {cm: chunks[cm] for cm in log}
+        stop.drained_to = max(log, default=-1)
+
+def _flex_result(segments, initial: float, accrued: float, output: str) -> Dict:
+    """ Fold engine segments into a simulate_flex result; returns (result, events processed). """
+    balance = initial
+    processed = 0
+    rows = []
+    cols = {"month": [], "balance": [], "interest": []}
+    for m, nxt, balance, month_int, applied in segments:
+        processed += 1 + applied
+        for _ in range(m, nxt):  # month by month, like simulate_flex_batch: the sum rounds the same
+            accrued += month_int
+        if output == "rows":
+            b, it = round(balance, 2), round(month_int, 2)
+            rows.extend({"month": k + 1, "balance": b, "interest": it} for k in range(m, nxt))
+        elif output == "columnar":
+            cols["month"].extend(range(m + 1, nxt + 1))
+            cols["balance"].extend([round(balance, 2)] * (nxt - m))
+            cols["interest"].extend([round(month_int, 2)] * (nxt - m))
+
+    result = {
         "final_balance": round(balance, 2),
         "interest_accrued": round(accrued, 2),
-        "schedule": schedule
     }
+    if output == "rows":
+        result["schedule"] = rows
+    elif output == "columnar":
+        result["schedule"] = cols
+    return result, processed
+
+def simulate_flex(initial: float, term_months: int, apr: float, topups: List[TopUp] = None, withdrawals: List[Withdrawal] = None,
+                  output: str = "rows") -> Dict:
+    """ Simulate a flex vault with monthly accrual, top-ups, and withdrawals.
+    Balances are computed per segment between events (see _flex_segments); interest is
+    still added one month at a time so the rounding matches the month loop.
+    Args:
+        initial: initial amount deposited
+        term_months: total term in months to simulate
+        apr: annual percentage rate (e.g. 5.0 for 5%)
+        topups: list of TopUp instances
+        withdrawals: list of Withdrawal instances
+        output: "rows" (default), "summary" to skip the schedule entirely, or "columnar"
+            for a schedule of parallel month/balance/interest lists
+    Returns:
+        Dict with final_balance, interest_accrued, schedule (list of month, balance, interest)
+    """
+    if output not in OUTPUT_MODES:
+        raise ValueError(f"output must be one of {OUTPUT_MODES}, got {output!r}")
+    start = time.perf_counter()
+    result, processed = _flex_result(_flex_segments(initial, term_months, apr, topups or [], withdrawals or []),
+                                     initial, 0.0, output)
+    FLEX_SECONDS.observe(time.perf_counter() - start)
+    FLEX_MONTHS.observe(max(term_months, 0))
+    FLEX_EVENTS.observe(processed)
+    return result
+
+def flex_checkpoint(initial: float, term_months: int, apr: float, topups: List[TopUp] = None,
+                    withdrawals: List[Withdrawal] = None, month: int = 0) -> FlexState:
+    """ Simulate a flex vault up to `month` and return the state to resume from.
+    The state sits at the last event month at or before `month` (state.month), so resuming
+    replays whole segments and matches a full simulate_flex run exactly.
+    """
+    state = FlexState(initial, term_months, apr, list(topups or []), list(withdrawals or []), month=max(month, 0))
+    accrued = 0.0
+    for m, nxt, _, month_int, _ in _flex_segments(initial, term_months, apr, state.topups, state.withdrawals, stop=state):
+        for _ in range(m, nxt):
+            accrued += month_int
+    state.accrued = accrued
+    return state
+
+def add_flex_events(state: FlexState, topups: List[TopUp] = None, withdrawals: List[Withdrawal] = None) -> FlexState:
+    """ State for the same cursor with extra events appended to the event lists.
+    Events at or after the cursor are applied incrementally. A top-up changes earlier months
+    when an earlier withdrawal was capped by the balance or drew on chunks at or after the
+    top-up's month; in that case, or for events before the cursor, the prefix is recomputed.
+    """
+    topups, withdrawals = list(topups or []), list(withdrawals or [])
+    all_topups, all_withdrawals = state.topups + topups, state.withdrawals + withdrawals
+    incremental = (all(w.month >= state.month for w in withdrawals)
+                   and all(t.month >= state.month and t.month > state.drained_to for t in topups)
+                   and not (topups and state.capped))
+    if not incremental:
+        return flex_checkpoint(state.initial, state.term_months, state.apr, all_topups, all_withdrawals, state.month)
+    return FlexState(state.initial, state.term_months, state.apr, all_topups, all_withdrawals, state.month,
+                     state.accrued, dict(state.chunks), state.drained_to, state.capped)
+
+def resume_flex(state: FlexState, output: str = "rows") -> Dict:
+    """ Finish a simulation from a FlexState.
+    final_balance and interest_accrued equal simulate_flex over the state's full event lists;
+    the schedule covers only months after the cursor (state.month + 1 onward).
+    """
+    if output not in OUTPUT_MODES:
+        raise ValueError(f"output must be one of {OUTPUT_MODES}, got {output!r}")
+    segments = _flex_segments(state.initial, state.term_months, state.apr, state.topups, state.withdrawals, resume=state)
+    return _flex_result(segments, state.initial, state.accrued, output)[0]
 
 def simulate_locked(initial: float, term_months: int, apr: float) -> Dict:
     # simple monthly accrual, no early withdrawals, no top-ups
@@ -82,3 +271,296 @@ def simulate_main(initial: float, term_months: int, apr: float) -> Dict:
         "final_balance": round(initial, 2),
         "interest_accrued": round(accrued, 2)
     }
+
+# ---------- Lazy schedules ----------
+GRANULARITIES = ("month", "day")
+DAYS_PER_MONTH = 30  # day rows use a 30-day month; a month's interest is split evenly over its days
+
+def _rows(months: Iterator[tuple], granularity: str) -> Iterator[Dict]:
+    """ (month, balance, monthly interest) tuples to schedule rows, per month or per day. """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}, got {granularity!r}")
+    if granularity == "month":
+        for month, balance, month_int in months:
+            yield {"month": month, "balance": round(balance, 2), "interest": round(month_int, 2)}
+        return
+    for month, balance, month_int in months:
+        b, it = round(balance, 2), round(month_int / DAYS_PER_MONTH, 2)
+        for day in range(1, DAYS_PER_MONTH + 1):
+            yield {"month": month, "day": day, "balance": b, "interest": it}
+
+def iter_flex(initial: float, term_months: int, apr: float, topups: List[TopUp] = None,
+              withdrawals: List[Withdrawal] = None, granularity: str = "month") -> Iterator[Dict]:
+    """ Flex schedule rows (same values as simulate_flex's schedule), produced lazily.
+    granularity="day" yields DAYS_PER_MONTH rows per month with a "day" key.
+    """
+    def months():
+        for m, nxt, balance, month_int, _ in _flex_segments(initial, term_months, apr, topups or [], withdrawals or []):
+            for k in range(m, nxt):
+                yield k + 1, balance, month_int
+    return _rows(months(), granularity)
+
+def _iter_simple(initial: float, term_months: int, apr: float, granularity: str) -> Iterator[Dict]:
+    monthly = monthly_interest(initial, apr)
+    return _rows(((m, initial, monthly) for m in range(1, term_months + 1)), granularity)
+
+def iter_locked(initial: float, term_months: int, apr: float, granularity: str = "month") -> Iterator[Dict]:
+    """ Locked vault schedule rows, lazily: flat balance, the same interest every month. """
+    return _iter_simple(initial, term_months, apr, granularity)
+
+def iter_main(initial: float, term_months: int, apr: float, granularity: str = "month") -> Iterator[Dict]:
+    """ Main account schedule rows, lazily: flat balance, the same interest every month. """
+    return _iter_simple(initial, term_months, apr, granularity)
+
+def _pack_events(events: Sequence[List], n: int):
+    """ Flatten per-scenario event lists into parallel (scenario, position, month, amount) arrays. """
+    idx, pos, months, amounts = [], [], [], []
+    if events is not None:
+        if len(events) != n:
+            raise ValueError(f"expected {n} event lists, got {len(events)}")
+        for i, evs in enumerate(events):
+            for j, e in enumerate(evs or []):
+                idx.append(i)
+                pos.append(j)
+                months.append(e.month)
+                amounts.append(e.amount)
+    return (np.asarray(idx, dtype=np.int64), np.asarray(pos, dtype=np.int64),
+            np.asarray(months, dtype=np.int64), np.asarray(amounts, dtype=np.float64))
+
+def _pack_flex(initials: np.ndarray, topups, withdrawals, convert: Callable = np.asarray):
+    """ Per-scenario chunk and withdrawal matrices for the batch flex engines.
+    initials is (N,) in the engine's unit; convert maps event amounts (euros) to it.
+    Returns (chunks, chunk_month, added) of shape (N, K): the initial deposit and the top-ups
+    summed per month (in list order), sorted by month, padded with 0 at month int64 max, and the
+    order each chunk was first added in (0 for the initial deposit, padding last); and
+    (wd_month, wd_amt) of shape (N, W): each scenario's withdrawals in list order, padded with month -1.
+    """
+    n = initials.shape[0]
+    t_idx, t_pos, t_month, t_amt = _pack_events(topups, n)
+    c_idx = np.concatenate([np.arange(n, dtype=np.int64), t_idx])
+    c_month = np.concatenate([np.zeros(n, dtype=np.int64), t_month])
+    c_pos = np.concatenate([np.full(n, -1, dtype=np.int64), t_pos])
+    c_amt = np.concatenate([initials, convert(t_amt)])
+    order = np.lexsort((c_month, c_idx))  # stable: same-month amounts stay in list order
+    c_idx, c_month, c_pos, c_amt = c_idx[order], c_month[order], c_pos[order], c_amt[order]
+    new_slot = np.ones(len(c_idx), dtype=bool)
+    new_slot[1:] = (c_idx[1:] != c_idx[:-1]) | (c_month[1:] != c_month[:-1])
+    starts = np.flatnonzero(new_slot)
+    s_idx, s_month = c_idx[starts], c_month[starts]
+    # added one by one, like chunks[month] += amount (reduceat may sum pairwise)
+    s_amt = np.zeros(len(starts), dtype=c_amt.dtype)
+    np.add.at(s_amt, np.cumsum(new_slot) - 1, c_amt)
+    s_first = np.minimum.reduceat(c_pos, starts) if len(starts) else c_pos[:0]
+    s_rank = np.arange(len(starts)) - np.searchsorted(s_idx, s_idx, side="left")
+    k = int(s_rank.max()) + 1 if n else 1
+    chunks = np.zeros((n, k), dtype=initials.dtype)
+    chunk_month = np.full((n, k), np.iinfo(np.int64).max)
+    added = np.full((n, k), np.iinfo(np.int64).max)
+    chunks[s_idx, s_rank] = s_amt
+    chunk_month[s_idx, s_rank] = s_month
+    added[s_idx, s_rank] = s_first
+
+    w_idx, w_pos, w_month, w_amt = _pack_events(withdrawals, n)
+    w = int(w_pos.max()) + 1 if len(w_pos) else 0
+    wd_month = np.full((n, w), -1, dtype=np.int64)
+    wd_amt = np.zeros((n, w), dtype=initials.dtype)
+    wd_month[w_idx, w_pos] = w_month
+    wd_amt[w_idx, w_pos] = convert(w_amt)
+    return chunks, chunk_month, added, wd_month, wd_amt
+
+def _round2(values):
+    """ Vectorized round(x, 2): half-even on the exact binary value, like the scalar path.
+    x is split into a 46-bit head and a 7-bit tail so x*100 is exact as head*100 + tail*100;
+    that resolves ties that only appear after the float multiplication.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    head = (values.view(np.int64) & ~np.int64(0x7F)).view(np.float64)
+    p, q = head * 100.0, (values - head) * 100.0
+    scaled = p + q
+    base = np.floor(scaled)
+    cents = np.rint(scaled)
+    tie = (scaled - base) == 0.5
+    if tie.any():
+        resid = (p[tie] - (base[tie] + 0.5)) + q[tie]
+        cents[tie] = np.where(resid > 0, base[tie] + 1.0, np.where(resid < 0, base[tie], cents[tie]))
+    return cents / 100.0
+
+def simulate_flex_batch(initials, terms, apr, topups: Sequence[List[TopUp]] = None,
+                        withdrawals: Sequence[List[Withdrawal]] = None, schedule: bool = True) -> Dict:
+    """ Vectorized simulate_flex over N scenarios at once.
+    Same accrual rules as simulate_flex; the month loop runs once for the longest term
+    and every step operates on all scenarios with NumPy array operations.
+    Args:
+        initials: array-like of N initial amounts
+        terms: array-like of N terms in months
+        apr: annual percentage rate, scalar or array-like of N
+        topups: optional sequence of N lists of TopUp instances
+        withdrawals: optional sequence of N lists of Withdrawal instances
+        schedule: False to skip the per-month arrays (totals only)
+    Returns:
+        Dict with final_balance (N,), interest_accrued (N,) and schedule with balance and
+        interest arrays of shape (N, max term); months past a scenario's term are NaN.
+    """
+    initials = np.asarray(initials, dtype=np.float64).ravel()
+    n = initials.shape[0]
+    terms = np.broadcast_to(np.asarray(terms, dtype=np.int64), (n,))
+    rate = np.broadcast_to(np.asarray(apr, dtype=np.float64), (n,)) / 100.0
+    FLEX_BATCH_SCENARIOS.inc(amount=n)
+
+    # chunks: one slot per distinct month added, in the order added within each scenario (the
+    # order balance and interest are summed in); drain[:, j] is the column of the j-th oldest.
+    # withdrawals: column j holds each scenario's j-th withdrawal, applied in list order
+    chunks, chunk_month, added, wd_month, wd_amt = _pack_flex(initials, topups, withdrawals)
+    by_added = np.argsort(added, axis=1, kind="stable")
+    chunks = np.take_along_axis(chunks, by_added, axis=1)
+    chunk_month = np.take_along_axis(chunk_month, by_added, axis=1)
+    drain = np.argsort(by_added, axis=1)
+    rows = np.arange(n)
+    k, w = chunks.shape[1], wd_month.shape[1]
+
+    def added_sum(values):
+        # left to right, one chunk at a time, like the scalar sums
+        total = values[:, 0].copy()
+        for c in range(1, k):
+            total += values[:, c]
+        return total
+
+    t_max = max(int(terms.max()), 0) if n else 0
+    balance = initials.copy()
+    accrued = np.zeros(n)
+    drained = True  # total (sum of all chunks) needs computing
+    if schedule:
+        sched_balance = np.full((n, t_max), np.nan)
+        sched_interest = np.full((n, t_max), np.nan)
+    for m in range(t_max):
+        active = m < terms
+        for j in range(w):
+            hit = active & (wd_month[:, j] == m)
+            if not hit.any():
+                continue
+            amt = np.where(hit, np.minimum(wd_amt[:, j], balance), 0.0)
+            balance = balance - amt
+            # take from the oldest chunks first, one chunk at a time with the scalar loop's
+            # float operations (a cumsum leaves different residues and can move a cent)
+            remaining = amt
+            for j in range(k):
+                draw = remaining > 0
+                if not draw.any():
+                    break
+                col = drain[:, j]
+                amount = chunks[rows, col]
+                take = np.where(draw, np.minimum(amount, remaining), 0.0)
+                chunks[rows, col] = amount - take
+                remaining = remaining - take
+            drained = True
+        if drained:
+            total = added_sum(chunks)
+            drained = False
+        balance = np.where(active, total, balance)
+        earning = (chunk_month <= m) & (chunks > 0)
+        month_int = added_sum(np.where(earning, chunks * rate[:, None] / 12.0, 0.0))
+        month_int = np.where(active, month_int, 0.0)
+        accrued += month_int
+        if schedule:
+            sched_balance[active, m] = balance[active]
+            sched_interest[active, m] = month_int[active]
+
+    result = {"final_balance": _round2(balance), "interest_accrued": _round2(accrued)}
+    if schedule:
+        result["schedule"] = {"balance": _round2(sched_balance), "interest": _round2(sched_interest)}
+    return result
+
+FLEX_PASS_MONTHS = 100_000  # scenarios × longest term per simulate_flex_batch pass
+
+def flex_passes(terms: Sequence[int], max_months: int = FLEX_PASS_MONTHS) -> Iterator[List[int]]:
+    """ Scenario indices per simulate_flex_batch pass: sorted by term, at most max_months scenario-months each.
+    A pass allocates (scenarios × its longest term), so one long term must not size a whole batch.
+    """
+    group = []
+    for i in sorted(range(len(terms)), key=terms.__getitem__):
+        term = max(int(terms[i]), 1)
+        if group and (len(group) + 1) * term > max_months:
+            yield group
+            group = []
+        group.append(i)
+    if group:
+        yield group
+
+def simulate_locked_batch(initials, terms, apr) -> Dict:
+    """ Vectorized simulate_locked over N scenarios; apr may be a scalar or array-like of N. """
+    initials = np.asarray(initials, dtype=np.float64)
+    monthly = initials * (np.asarray(apr, dtype=np.float64) / 100.0) / 12.0
+    accrued = monthly * np.asarray(terms, dtype=np.int64)
+    return {
+        "final_balance": _round2(initials),
+        "interest_accrued": _round2(accrued)
+    }
+
+def simulate_main_batch(initials, terms, apr) -> Dict:
+    """ Vectorized simulate_main over N scenarios; apr may be a scalar or array-like of N. """
+    initials = np.asarray(initials, dtype=np.float64)
+    monthly = initials * (np.asarray(apr, dtype=np.float64) / 100.0) / 12.0
+    accrued = monthly * np.asarray(terms, dtype=np.int64)
+    return {
+        "final_balance": _round2(initials),
+        "interest_accrued": _round2(accrued)
+    }
+
+def simulate_sweep(initial: float, terms: Sequence[int], months: Sequence[int], amounts: Sequence[float],
+                   flex_apr: float, locked_apr: float, main_apr: float, topups: List[TopUp] = None) -> Dict:
+    """ What-if grid over term × withdrawal month × withdrawal amount for all three products.
+    Every flex cell is one scenario with a single withdrawal, run together in one batch pass;
+    locked and main have no withdrawals so they only vary by term.
+    Args:
+        initial: initial amount deposited
+        terms: terms in months to evaluate
+        months: withdrawal months (0-based) to evaluate
+        amounts: withdrawal amounts to evaluate
+        flex_apr, locked_apr, main_apr: annual percentage rates per product
+        topups: list of TopUp instances applied to every flex scenario
+    Returns:
+        Dict with the axes, flex interest/final balance arrays of shape (terms, amounts, months)
+        (NaN where the month falls outside the term), locked/main interest per term,
+        and the best option per product (plus the best flex option per amount).
+    """
+    terms = np.asarray(terms, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    tt, aa, mm = np.meshgrid(terms, amounts, months, indexing="ij")
+    n = tt.size
+    withdrawals = [[Withdrawal(int(m), float(a))] for m, a in zip(mm.ravel(), aa.ravel())]
+    flex = simulate_flex_batch(np.full(n, initial), tt.ravel(), flex_apr, [topups or []] * n, withdrawals,
+                               schedule=False)
+    valid = mm < tt
+    flex_interest = np.where(valid, flex["interest_accrued"].reshape(tt.shape), np.nan)
+    flex_balance = np.where(valid, flex["final_balance"].reshape(tt.shape), np.nan)
+    locked = simulate_locked_batch(np.full(len(terms), initial), terms, locked_apr)["interest_accrued"]
+    main = simulate_main_batch(np.full(len(terms), initial), terms, main_apr)["interest_accrued"]
+
+    def best_flex(grid, amount_idx=None):
+        if np.isnan(grid).all():
+            return None
+        t, a, m = np.unravel_index(np.nanargmax(grid), grid.shape)
+        if amount_idx is not None:
+            a = amount_idx
+        return {"term_months": int(terms[t]), "withdrawal_month": int(months[m]),
+                "withdrawal_amount": float(amounts[a]), "interest_accrued": float(flex_interest[t, a, m])}
+
+    def best_simple(interest):
+        if not len(interest):
+            return None
+        t = int(np.argmax(interest))
+        return {"term_months": int(terms[t]), "interest_accrued": float(interest[t])}
+
+    return {
+        "terms": terms, "months": months, "amounts": amounts,
+        "flex": {"interest_accrued": flex_interest, "final_balance": flex_balance},
+        "locked": {"interest_accrued": locked},
+        "main": {"interest_accrued": main},
+        "best": {
+            "flex": best_flex(flex_interest),
+            "locked": best_simple(locked),
+            "main": best_simple(main),
+        },
+        "best_flex_by_amount": [best_flex(flex_interest[:, [a], :], a) for a in range(len(amounts))],
+    }
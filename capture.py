@@ -0,0 +1,125 @@
+# capture.py
+import os
+import json
+import base64
+import time
+import queue
+import random
+import atexit
+import threading
+from typing import Dict, Optional
+
+class RequestCapture:
+    """
+    Appends captured requests to a JSONL file from a background thread.
+    record() only enqueues, so the request path never touches the disk; when the queue
+    is full records are dropped (and counted) rather than slowing requests down.
+    """
+    def __init__(self, path: str, sample: float = 1.0, batch_size: int = 256,
+                 flush_interval: float = 1.0, max_queue: int = 10_000, max_body: int = 65_536):
+        self.path = path
+        self.sample = sample
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_body = max_body
+        self.written = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="request-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def should_sample(self) -> bool:
+        return self.sample >= 1.0 or random.random() < self.sample
+
+    def record(self, method: str, path: str, query: str, content_type: str, body: bytes,
+               status: Optional[int], latency_ms: float):
+        too_big = len(body) > self.max_body
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            text = None  # binary (msgpack) body: kept as base64
+        rec = {
+            "ts": round(time.time(), 3),
+            "method": method,
+            "path": path,
+            "query": query,
+            "content_type": content_type,
+            "body": None if too_big or text is None else text,
+            "truncated": too_big,
+            "status": status,
+            "latency_ms": round(latency_ms, 3),
+        }
+        if text is None and not too_big:
+            rec["body_b64"] = base64.b64encode(body).decode()
+        try:
+            self._queue.put_nowait(rec)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        done = False
+        while not done:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                done = True
+                batch = [r for r in batch if r is not None]
+            if batch:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(r) + "\n" for r in batch))
+                self.written += len(batch)
+
+    def close(self):
+        """ Flush what is queued and stop the writer. """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+class CaptureMiddleware:
+    """ ASGI middleware that captures requests under prefix (body, status, latency). """
+    def __init__(self, app, capture: RequestCapture, prefix: str = "/simulate/"):
+        self.app = app
+        self.capture = capture
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not scope["path"].startswith(self.prefix)
+                or not self.capture.should_sample()):
+            return await self.app(scope, receive, send)
+
+        chunks, status = [], [None]
+
+        async def receive_tee():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def send_tee(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_tee, send_tee)
+        finally:
+            headers = dict(scope.get("headers") or [])
+            self.capture.record(
+                scope["method"], scope["path"], scope.get("query_string", b"").decode(),
+                headers.get(b"content-type", b"").decode(), b"".join(chunks),
+                status[0], (time.perf_counter() - start) * 1000,
+            )
+
+def capture_from_env() -> Optional[RequestCapture]:
+    """ RequestCapture configured from SIM_CAPTURE_* env vars, or None when capture is off. """
+    path = os.getenv("SIM_CAPTURE_PATH")
+    if not path:
+        return None
+    return RequestCapture(path, sample=float(os.getenv("SIM_CAPTURE_SAMPLE", "1.0")))
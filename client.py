@@ -0,0 +1,144 @@
+# client.py
+import os
+import json
+import threading
+from typing import Dict, Iterator, List
+from registry import REGISTRY
+
+API_URL = os.getenv("SMARTSAVER_API_URL", "http://127.0.0.1:8000")
+POOL_SIZE = int(os.getenv("SMARTSAVER_POOL_SIZE", "16"))
+TIMEOUT = float(os.getenv("SMARTSAVER_TIMEOUT", "10"))
+ENGINE = os.getenv("SMARTSAVER_ENGINE", "http")  # http (API at API_URL) | local (calculator in-process)
+
+class SmartSaverClient:
+    """
+    Small keep-alive client for the SmartSaver API.
+    One pooled requests.Session per client, so repeated calls reuse TCP connections
+    instead of paying a new handshake each time.
+    """
+    def __init__(self, base_url: str = API_URL, pool_size: int = POOL_SIZE, timeout: float = TIMEOUT):
+        import requests  # imported on first use, so importing client.py stays cheap
+        from requests.adapters import HTTPAdapter
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path: str, payload, params: Dict = None) -> Dict:
+        resp = self.session.post(f"{self.base_url}{path}", json=payload, params=params, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def simulate(self, product: str, initial: float, term_months: int,
+                 topups: List[Dict] = None, withdrawals: List[Dict] = None, output: str = "rows") -> Dict:
+        """
+        One product via /simulate/{product}; top-ups/withdrawals only apply to flex.
+        output is "rows", "summary" (no schedule) or "columnar" (parallel arrays).
+        """
+        payload = {"initial": initial, "term_months": term_months}
+        if product == "flex":
+            payload.update(topups=topups or [], withdrawals=withdrawals or [])
+        return self._post(f"/simulate/{product}", payload, {"output": output})
+
+    def stream_schedule(self, product: str, initial: float, term_months: int, topups: List[Dict] = None,
+                        withdrawals: List[Dict] = None, granularity: str = "month") -> Iterator[Dict]:
+        """
+        Schedule rows from /simulate/{product}?output=stream as they arrive; the last item
+        is {"summary": {...}}. granularity is "month" or "day".
+        """
+        payload = {"initial": initial, "term_months": term_months}
+        if product == "flex":
+            payload.update(topups=topups or [], withdrawals=withdrawals or [])
+        with self.session.post(f"{self.base_url}/simulate/{product}", json=payload, stream=True, timeout=self.timeout,
+                               params={"output": "stream", "granularity": granularity}) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def compare(self, initial: float, term_months: int,
+                topups: List[Dict] = None, withdrawals: List[Dict] = None, output: str = "rows") -> Dict:
+        """ All three products in one round-trip via /simulate/compare. """
+        return self._post("/simulate/compare", {
+            "initial": initial, "term_months": term_months,
+            "topups": topups or [], "withdrawals": withdrawals or [],
+        }, {"output": output})
+
+    def sweep(self, initial: float, terms: List[int] = None, withdrawal_months: List[int] = None,
+              amounts: List[float] = None, topups: List[Dict] = None) -> Dict:
+        """ Full what-if grid (term × withdrawal month × amount) via /simulate/sweep. """
+        return self._post("/simulate/sweep", {
+            "initial": initial, "terms": terms, "withdrawal_months": withdrawal_months,
+            "amounts": amounts, "topups": topups or [],
+        })
+
+    def truth(self) -> Dict:
+        resp = self.session.get(f"{self.base_url}/truth", timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def close(self):
+        self.session.close()
+
+class LocalEngine:
+    """
+    Same calls as SmartSaverClient (simulate, stream_schedule, compare, truth) answered
+    in-process through cache.simulate_cached, with no HTTP round-trip.
+    Rates come from registry.REGISTRY, so truth.json edits are picked up without a restart.
+    Results come from the shared simulation cache, so treat them as read-only.
+    The calculator stack is imported on first use, only in local mode.
+    """
+    def _events(self, topups: List[Dict], withdrawals: List[Dict]):
+        from calculator import TopUp, Withdrawal
+        return ([TopUp(e["month"], float(e["amount"])) for e in topups or []],
+                [Withdrawal(e["month"], float(e["amount"])) for e in withdrawals or []])
+
+    def simulate(self, product: str, initial: float, term_months: int,
+                 topups: List[Dict] = None, withdrawals: List[Dict] = None, output: str = "rows") -> Dict:
+        """ One product, same result as /simulate/{product}; top-ups/withdrawals only apply to flex. """
+        from cache import simulate_cached
+        apr = REGISTRY.get().aprs[product]
+        if product != "flex":
+            return simulate_cached(product, float(initial), term_months, apr)
+        return simulate_cached("flex", float(initial), term_months, apr, *self._events(topups, withdrawals), output)
+
+    def stream_schedule(self, product: str, initial: float, term_months: int, topups: List[Dict] = None,
+                        withdrawals: List[Dict] = None, granularity: str = "month") -> Iterator[Dict]:
+        """ Schedule rows produced lazily; the last item is {"summary": {...}}. """
+        from calculator import iter_flex, iter_locked, iter_main
+        apr = REGISTRY.get().aprs[product]
+        if product == "flex":
+            yield from iter_flex(float(initial), term_months, apr, *self._events(topups, withdrawals), granularity)
+        else:
+            rows = iter_locked if product == "locked" else iter_main
+            yield from rows(float(initial), term_months, apr, granularity)
+        yield {"summary": self.simulate(product, initial, term_months, topups, withdrawals, "summary")}
+
+    def compare(self, initial: float, term_months: int,
+                topups: List[Dict] = None, withdrawals: List[Dict] = None, output: str = "rows") -> Dict:
+        """ All three products, same shape as /simulate/compare. """
+        return {
+            "locked": self.simulate("locked", initial, term_months),
+            "main": self.simulate("main", initial, term_months),
+            "flex": self.simulate("flex", initial, term_months, topups, withdrawals, output),
+        }
+
+    def truth(self) -> Dict:
+        return REGISTRY.get().config
+
+    def close(self):
+        pass
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_client():
+    """ Process-wide shared client: SmartSaverClient, or LocalEngine with SMARTSAVER_ENGINE=local. """
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = LocalEngine() if ENGINE == "local" else SmartSaverClient()
+    return _default
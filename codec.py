@@ -0,0 +1,145 @@
+# codec.py
+"""
+Content negotiation and fast body parsing for /simulate/*.
+
+Responses are msgpack when the client sends `Accept: application/msgpack`, JSON otherwise
+(orjson when installed). Request bodies may be JSON or msgpack (by Content-Type). Bodies are
+checked in bulk and turned into TopUp/Withdrawal objects directly, so large event lists
+skip per-item pydantic validation. Events can be {"month": m, "amount": a} objects or
+compact [month, amount] pairs.
+"""
+import json
+from itertools import starmap
+from operator import itemgetter
+from typing import Any, Dict, List
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from calculator import TopUp, Withdrawal
+
+try:
+    import orjson
+except ImportError:  # optional: plain json is used instead
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # optional: msgpack requests get 415, msgpack is never negotiated
+    msgpack = None
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+def wants_msgpack(request: Request) -> bool:
+    return msgpack is not None and any(t in request.headers.get("accept", "") for t in MSGPACK_TYPES)
+
+def is_msgpack(request: Request) -> bool:
+    return request.headers.get("content-type", "").startswith(MSGPACK_TYPES)
+
+def dumps(obj: Any) -> bytes:
+    """ JSON bytes; NaN becomes null with orjson (and NaN with the json fallback). """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj).encode()
+
+def loads(body: bytes) -> Any:
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+def pack(obj: Any) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+def respond(request: Request, obj: Any) -> Response:
+    """ obj encoded per the request's Accept header, skipping FastAPI's jsonable_encoder pass. """
+    if wants_msgpack(request):
+        return Response(pack(obj), media_type=MSGPACK_TYPE)
+    return Response(dumps(obj), media_type=JSON_TYPE)
+
+async def read_body(request: Request) -> Any:
+    """ Decoded JSON or msgpack request body; 400 when it does not parse, 415 without msgpack support. """
+    body = await request.body()
+    if is_msgpack(request):
+        if msgpack is None:
+            raise HTTPException(status_code=415, detail="msgpack support is not installed")
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid msgpack body: {e}")
+    try:
+        return loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+
+# ---------- Fast validation ----------
+_month_amount = itemgetter("month", "amount")
+_first, _second = itemgetter(0), itemgetter(1)
+
+class BodyError(ValueError):
+    """ A body field failed validation; loc is the path to it, like pydantic's error loc. """
+    def __init__(self, loc: tuple, msg: str):
+        super().__init__(f"{'.'.join(map(str, loc))}: {msg}" if loc else msg)
+        self.loc = loc
+        self.msg = msg
+
+    def detail(self) -> List[Dict]:
+        return [{"loc": ["body", *self.loc], "msg": self.msg, "type": "value_error"}]
+
+def _int(value, loc: tuple) -> int:
+    if type(value) is int:
+        return value
+    if type(value) is float and value.is_integer():
+        return int(value)
+    raise BodyError(loc, "must be an integer")
+
+def _number(value, loc: tuple) -> float:
+    if type(value) is float or type(value) is int:
+        return float(value)
+    raise BodyError(loc, "must be a number")
+
+def _well_typed(pairs: List) -> bool:
+    return (set(map(len, pairs)) <= {2} and set(map(type, map(_first, pairs))) <= {int}
+            and set(map(type, map(_second, pairs))) <= {int, float})
+
+def parse_events(raw, cls, field: str) -> List:
+    """ A list of TopUp/Withdrawal from dicts or [month, amount] pairs. """
+    if raw is None:
+        return []
+    if not isinstance(raw, list):
+        raise BodyError((field,), "must be a list")
+    # fast path: types checked in bulk (no Python-level loop), then one starmap over the pairs
+    try:
+        pairs = list(map(_month_amount, raw)) if raw and isinstance(raw[0], dict) else raw
+        if _well_typed(pairs):
+            return list(starmap(cls, pairs))
+    except (KeyError, TypeError):
+        pass
+    # slow path: per-item checks, for coercion (e.g. month 6.0) and a precise error location
+    events = []
+    for i, e in enumerate(raw):
+        if isinstance(e, dict):
+            try:
+                month, amount = e["month"], e["amount"]
+            except KeyError as k:
+                raise BodyError((field, i, k.args[0]), "field required")
+        elif isinstance(e, (list, tuple)) and len(e) == 2:
+            month, amount = e
+        else:
+            raise BodyError((field, i), "must be {month, amount} or [month, amount]")
+        events.append(cls(_int(month, (field, i, "month")), _number(amount, (field, i, "amount"))))
+    return events
+
+def parse_simple(data) -> Dict:
+    """ initial and term_months from a decoded body. """
+    if not isinstance(data, dict):
+        raise BodyError((), "must be an object")
+    for key in ("initial", "term_months"):
+        if key not in data:
+            raise BodyError((key,), "field required")
+    return {"initial": _number(data["initial"], ("initial",)), "term_months": _int(data["term_months"], ("term_months",))}
+
+def parse_flex(data) -> Dict:
+    """ initial, term_months, topups and withdrawals from a decoded body. """
+    fields = parse_simple(data)
+    fields["topups"] = parse_events(data.get("topups"), TopUp, "topups")
+    fields["withdrawals"] = parse_events(data.get("withdrawals"), Withdrawal, "withdrawals")
+    return fields
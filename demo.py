@@ -1,17 +1,47 @@
 # demo.py
+import os
 import streamlit as st
-import requests
-import json
-import pandas as pd
-from advisor import chat
+from client import get_client
+from metrics import mark_ready
+from parsers import parse_float, parse_term, parse_bool, parse_withdraw, parse_goal
+from registry import REGISTRY
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SIM_CACHE_ENTRIES = int(os.getenv("DEMO_SIM_CACHE_ENTRIES", "1024"))
+
+# ---------- Cached loads (shared by every session; re-read only when the file changes) ----------
+@st.cache_data
+def _read_text(file_name: str, mtime_ns: int) -> str:
+    with open(file_name) as f:
+        return f.read()
+
+def file_version(file_name: str) -> int:
+    return os.stat(file_name).st_mtime_ns
 
 # Load custom CSS
 def local_css(file_name):
-    with open(file_name) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    path = os.path.join(HERE, file_name)
+    st.markdown(f"<style>{_read_text(path, file_version(path))}</style>", unsafe_allow_html=True)
 
 local_css("styles.css")
 
+# ---------- Cached simulations, keyed on the widget inputs (and the truth version) ----------
+@st.cache_data(max_entries=SIM_CACHE_ENTRIES, show_spinner=False)
+def run_flex(truth_version: str, initial: float, term: int, withdraw_month: int, withdraw_amt: float) -> dict:
+    return get_client().simulate(
+        "flex", initial, term,
+        withdrawals=[{"month": withdraw_month, "amount": withdraw_amt}],
+        output="columnar"
+    )
+
+@st.cache_data(max_entries=SIM_CACHE_ENTRIES, show_spinner=False)
+def run_compare(truth_version: str, initial: float, term: int, withdraw_month, withdraw_amt) -> dict:
+    w = []
+    if withdraw_amt and withdraw_month is not None:
+        w = [{"month": int(withdraw_month), "amount": float(withdraw_amt)}]
+    # One round-trip for all three products
+    return get_client().compare(initial, term, withdrawals=w)
+
 st.set_page_config(page_title="SmartSaver Flex Vault Demo", layout="wide")
 
 # Add "monefit" title at the top left
@@ -31,9 +61,8 @@ st.markdown("""
 
 # Sidebar - Truth Config
 st.sidebar.header("Vault Truth Config")
-with open("truth.json") as f:
-    truth = json.load(f)
-st.sidebar.json(truth)
+truth = REGISTRY.get()
+st.sidebar.json(truth.config)
 
 # Layout
 col1, col2 = st.columns(2)
@@ -120,64 +149,6 @@ with col1:
             return QUESTIONS[step]["prompt"]
         return "You're all set. Type 'restart' to try another scenario."
 
-    # ---------- Parsers ----------
-    import re
-    def parse_float(text):
-        try:
-            return float(text.replace("€", "").replace(",", "").strip())
-        except Exception:
-            return None
-
-    def parse_term(text):
-        # Expect integer 12..24
-        try:
-            val = int(float(text.strip()))
-            if 12 <= val <= 24:
-                return val
-            return None
-        except Exception:
-            return None
-
-    def parse_bool(text):
-        t = text.strip().lower()
-        if t in ["yes", "y", "true", "1"]: return True
-        if t in ["no", "n", "false", "0"]: return False
-        return None
-
-    def parse_withdraw(text):
-        t = text.strip().lower()
-        if t in ["none", "no", "n", "0", "skip"]:
-            return None, None
-        nums = re.findall(r"\d[\d,\.]*", t)
-        amt = None
-        mon = None
-        if nums:
-            amt = parse_float(nums[0])
-            if len(nums) >= 2:
-                try:
-                    mon = int(float(nums[1]))
-                except Exception:
-                    mon = None
-        return amt, mon
-
-    def parse_goal(text: str):
-        t = text.strip().lower()
-
-        # Direct intent keywords
-        if any(x in t for x in ["apartment", "house", "wedding", "holiday", "car"]):
-            return "short_term_goal"
-        if any(x in t for x in ["grow", "portfolio", "long term", "retirement", "wealth"]):
-            return "long_term_growth"
-        if any(x in t for x in ["passive", "income", "side hustle"]):
-            return "passive_income"
-        if any(x in t for x in ["safe", "safety", "flexibility", "liquid", "access"]):
-            return "flexibility_with_safety"
-        if any(x in t for x in ["max", "maximum", "returns", "yield"]):
-            return "maximum_returns"
-
-        # Fallback → assume flexibility if unsure
-        return "flexibility_with_safety"
-
     # ---------- Simple recommender ----------
     def recommend_product(a: dict) -> str:
         if a["liquidity"] or a["withdraw_amount"]:
@@ -188,25 +159,11 @@ with col1:
             return "flex"
         return "main"
 
-    # ---------- Simulations via your FastAPI ----------
+    # ---------- Simulations via your FastAPI (or in-process, SMARTSAVER_ENGINE=local) ----------
     def simulate_all(a: dict) -> dict:
-        base = "http://127.0.0.1:8000"
-        # Locked
-        locked = requests.post(f"{base}/simulate/locked", json={
-            "initial": a["initial"], "term_months": a["term"]
-        }).json()
-        # Main
-        main = requests.post(f"{base}/simulate/main", json={
-            "initial": a["initial"], "term_months": a["term"]
-        }).json()
-        # Flex (with optional withdrawal)
-        w = []
-        if a["withdraw_amount"] and a["withdraw_month"] is not None:
-            w = [{"month": int(a["withdraw_month"]), "amount": float(a["withdraw_amount"])}]
-        flex = requests.post(f"{base}/simulate/flex", json={
-            "initial": a["initial"], "term_months": a["term"], "withdrawals": w
-        }).json()
-        return {"locked": locked, "main": main, "flex": flex}
+        # Flex gets the optional withdrawal; locked/main ignore it
+        return run_compare(REGISTRY.get().version, a["initial"], a["term"],
+                           a["withdraw_month"], a["withdraw_amount"])
 
     # Show compact history
     for entry in st.session_state.qa["history"]:
@@ -406,30 +363,19 @@ with col2:
         run_sim = True
     else:
         run_sim = st.button("Run Simulation", use_container_width=True)
-
     if run_sim:
-        url = "http://127.0.0.1:8000/simulate/flex"
-        payload = {
-            "initial": initial,
-            "term_months": term,
-            "withdrawals": [{"month": withdraw_month, "amount": withdraw_amt}]
-        }
-        resp = requests.post(url, json=payload)
-        data = resp.json()
+        st.session_state["calc_live"] = True  # from now on results follow the widgets
+
+    if st.session_state.get("calc_live"):
+        # Identical inputs (e.g. a slider moved back) are served from the cache, not recomputed
+        data = run_flex(REGISTRY.get().version, initial, term, withdraw_month, withdraw_amt)
 
         st.success("Simulation Complete")
         st.json(data)
 
-        # NEW CHART BLOCK (pandas-based)
-        # The API returns 'schedule' as a list of dicts; sometimes it may be a dict keyed by ints.
-        schedule = data.get("schedule", [])
-
-        # If schedule is a dict (0: {...}, 1: {...}), normalize it to a list of rows.
-        if isinstance(schedule, dict):
-            schedule = list(schedule.values())
-
-        # Build a DataFrame
-        df = pd.DataFrame(schedule)  # columns: month, balance, interest
+        # Columnar schedule: parallel month/balance/interest lists load straight into a DataFrame
+        import pandas as pd  # only needed once there is a chart to draw; keeps the first paint fast
+        df = pd.DataFrame(data.get("schedule", {}))  # columns: month, balance, interest
 
         # Safety: ensure expected columns exist
         expected_cols = {"month", "balance", "interest"}
@@ -445,3 +391,9 @@ with col2:
             st.subheader("Monthly Interest Accrued")
             st.line_chart(df, x="month", y="interest")
 
+# Cold start of this server process (interpreter, imports, first script run), recorded once
+@st.cache_resource
+def startup_seconds() -> float:
+    return mark_ready("demo")
+
+st.sidebar.caption(f"Server cold start: {startup_seconds():.2f} s")
@@ -0,0 +1,137 @@
+# fake_openai.py
+"""
+Local stand-in for the OpenAI chat-completions API, for offline latency/concurrency testing.
+
+    uvicorn fake_openai:app --port 8100
+    export OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake
+
+Replies are scripted: a user message containing an amount triggers simulate_returns tool
+calls (one per product mentioned, all three for "compare"); a tool result is summarised.
+To exercise retries, FAKE_OPENAI_MAX_CONCURRENCY rejects requests beyond that many in
+flight with 429 (and a retry-after header), and FAKE_OPENAI_ERROR_RATE fails that fraction
+of requests with 503.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY = float(os.getenv("FAKE_OPENAI_LATENCY", "0.2"))          # seconds before the first token
+TOKEN_DELAY = float(os.getenv("FAKE_OPENAI_TOKEN_DELAY", "0.01"))  # seconds between streamed tokens
+MAX_CONCURRENCY = int(os.getenv("FAKE_OPENAI_MAX_CONCURRENCY", "0"))  # 429 beyond this many in flight; 0 = no limit
+ERROR_RATE = float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0"))          # fraction of requests failing with 503
+RETRY_AFTER = os.getenv("FAKE_OPENAI_RETRY_AFTER", "0.1")             # seconds, sent with every 429
+
+app = FastAPI(title="Fake OpenAI")
+STATS = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "rate_limited": 0, "errors": 0}
+
+AMOUNT = re.compile(r"\d[\d,\.]*")
+TERM = re.compile(r"(\d+)\s*(?:months?|m\b)")
+
+def _reply(messages, tools):
+    """ Returns (content, tool_calls) for the conversation so far. """
+    last = messages[-1]
+    if last["role"] == "tool":
+        results = [m for m in messages if m["role"] == "tool"]
+        lines = []
+        for m in results:
+            data = json.loads(m["content"])
+            lines.append(f"interest ≈ €{data.get('interest_accrued')}, final balance €{data.get('final_balance')}")
+        return "Illustrative only. " + "; ".join(lines) + ".", []
+
+    text = str(last.get("content") or "").lower()
+    nums = AMOUNT.findall(text.replace("€", ""))
+    if not tools or not nums:
+        return "How much would you like to invest initially? (e.g., 5000)", []
+
+    term_match = TERM.search(text)
+    term = int(term_match.group(1)) if term_match else 12
+    initial = float(nums[0].replace(",", ""))
+    products = [p for p in ("flex", "locked", "main") if p in text or "compare" in text] or ["flex"]
+    calls = [{
+        "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+        "function": {"name": "simulate_returns",
+                     "arguments": json.dumps({"product": p, "initial": initial, "term_months": term})},
+    } for p in products]
+    return None, calls
+
+def _usage(messages, content):
+    prompt = sum(len(str(m.get("content") or "")) for m in messages) // 4
+    completion = len(content or "") // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+async def _sse(model, messages, content, tool_calls, include_usage=False):
+    cid, created = f"chatcmpl-{uuid.uuid4().hex[:12]}", int(time.time())
+
+    def chunk(delta, finish=None):
+        return "data: " + json.dumps({
+            "id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }) + "\n\n"
+
+    try:
+        await asyncio.sleep(LATENCY)
+        yield chunk({"role": "assistant", "content": ""})
+        for i, call in enumerate(tool_calls):
+            yield chunk({"tool_calls": [{"index": i, **call}]})
+        for token in re.findall(r"\S+\s*", content or ""):
+            await asyncio.sleep(TOKEN_DELAY)
+            yield chunk({"content": token})
+        yield chunk({}, "tool_calls" if tool_calls else "stop")
+        if include_usage:
+            # like the real API: one extra chunk with empty choices carrying usage
+            yield "data: " + json.dumps({
+                "id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [], "usage": _usage(messages, content),
+            }) + "\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        STATS["in_flight"] -= 1
+
+def _error(status: int, kind: str, message: str, headers=None) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": kind, "param": None, "code": None}},
+                        status_code=status, headers=headers)
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages, model = body["messages"], body.get("model", "fake")
+    content, tool_calls = _reply(messages, body.get("tools"))
+    STATS["requests"] += 1
+    if MAX_CONCURRENCY and STATS["in_flight"] >= MAX_CONCURRENCY:
+        STATS["rate_limited"] += 1
+        return _error(429, "rate_limit_error", "Rate limit reached (fake)", {"retry-after": RETRY_AFTER})
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        STATS["errors"] += 1
+        return _error(503, "server_error", "The server is overloaded (fake)")
+    STATS["in_flight"] += 1
+    STATS["max_in_flight"] = max(STATS["max_in_flight"], STATS["in_flight"])
+
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(_sse(model, messages, content, tool_calls, include_usage),
+                                 media_type="text/event-stream")
+    try:
+        await asyncio.sleep(LATENCY + TOKEN_DELAY * len((content or "").split()))
+    finally:
+        STATS["in_flight"] -= 1
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion",
+        "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "finish_reason": "tool_calls" if tool_calls else "stop",
+                     "message": {"role": "assistant", "content": content, "tool_calls": tool_calls or None}}],
+        "usage": _usage(messages, content),
+    }
+
+@app.get("/stats")
+def stats(): return STATS
+
+@app.delete("/stats")
+def reset_stats():
+    STATS.update(requests=0, max_in_flight=0, rate_limited=0, errors=0)
+    return STATS
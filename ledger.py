@@ -0,0 +1,130 @@
+# ledger.py
+"""
+Integer-cents engine for whole books of accounts.
+
+Amounts are int64 cents and APRs are integers in units of 1/10_000 %, so the only rounding
+is the monthly interest posting, done with an explicit policy. Accrued interest is the sum
+of the posted monthly amounts, so an account's total always equals the sum of its schedule
+rows and book totals are exact integer sums, identical on every run and platform.
+Accrual rules (chunks, oldest-first withdrawals, top-ups earning from their month) are the
+same as calculator.simulate_flex.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from calculator import TopUp, Withdrawal, _pack_flex
+
+APR_SCALE = 10_000                     # APR units per percent: 8.25% -> 82_500
+MONTHLY_DIVISOR = 100 * APR_SCALE * 12  # cents * apr units / MONTHLY_DIVISOR = monthly interest in cents
+ROUNDING_MODES = ("half_even", "half_up", "down")
+_INT64_HEADROOM = 1 << 61               # products and 2 * products must stay below int64 max
+
+def to_cents(amounts) -> np.ndarray:
+    """ Euro amounts to int64 cents, rounded to the nearest cent. """
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100.0).astype(np.int64)
+
+def from_cents(cents):
+    """ int64 cents back to euro floats (for display / JSON). """
+    return np.asarray(cents, dtype=np.int64) / 100.0
+
+def apr_units(apr) -> np.ndarray:
+    """ APR in percent to integer units of 1/APR_SCALE %; rejects rates finer than that. """
+    apr = np.asarray(apr, dtype=np.float64)
+    units = np.rint(apr * APR_SCALE)
+    if np.any(np.abs(units - apr * APR_SCALE) > 1e-6):
+        raise ValueError(f"APR must be a multiple of {1 / APR_SCALE}%")
+    return units.astype(np.int64)
+
+def divide(num, den: int, rounding: str = "half_even") -> np.ndarray:
+    """ Integer num / den (den > 0) rounded per policy; exact, no floats involved.
+    Built on floor division, so "down" and "half_up" round toward -inf / +inf for negative num. """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"rounding must be one of {ROUNDING_MODES}, got {rounding!r}")
+    q, r = np.divmod(np.asarray(num, dtype=np.int64), den)
+    if rounding == "down":
+        return q
+    twice = 2 * r
+    if rounding == "half_up":
+        return q + (twice >= den)
+    return q + ((twice > den) | ((twice == den) & (q % 2 == 1)))
+
+def _check_range(max_cents, units):
+    if units.size and max_cents * int(units.max()) >= _INT64_HEADROOM:
+        raise OverflowError("amounts too large for int64 cents arithmetic")
+
+def ledger_flex(initials, terms, apr, topups: Sequence[List[TopUp]] = None,
+                withdrawals: Sequence[List[Withdrawal]] = None, rounding: str = "half_even") -> Dict:
+    """ Flex vault over N accounts in int64 cents.
+    Args:
+        initials: array-like of N initial amounts (euros, rounded to the cent)
+        terms: array-like of N terms in months
+        apr: annual percentage rate, scalar or array-like of N
+        topups: optional sequence of N lists of TopUp instances
+        withdrawals: optional sequence of N lists of Withdrawal instances
+        rounding: how each month's interest is rounded to the cent: "half_even" (default),
+            "half_up" or "down"
+    Returns:
+        Dict of int64 cents: final_balance (N,), interest_accrued (N,), schedule with balance
+        and interest of shape (N, max term), zero past each account's term, and totals
+        (Python ints) over the whole book.
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"rounding must be one of {ROUNDING_MODES}, got {rounding!r}")
+    initials = to_cents(initials).ravel()
+    n = initials.shape[0]
+    terms = np.broadcast_to(np.asarray(terms, dtype=np.int64), (n,))
+    units = np.broadcast_to(apr_units(apr), (n,))
+
+    chunks, chunk_month, _, wd_month, wd_amt = _pack_flex(initials, topups, withdrawals, to_cents)
+    _check_range(int(np.clip(chunks, 0, None).sum(axis=1).max()) if n else 0, units)
+    w = wd_month.shape[1]
+
+    t_max = max(int(terms.max()), 0) if n else 0
+    balance = initials.copy()
+    accrued = np.zeros(n, dtype=np.int64)
+    sched_balance = np.zeros((n, t_max), dtype=np.int64)
+    sched_interest = np.zeros((n, t_max), dtype=np.int64)
+    for m in range(t_max):
+        active = m < terms
+        for j in range(w):
+            hit = active & (wd_month[:, j] == m)
+            if not hit.any():
+                continue
+            amt = np.where(hit, np.minimum(wd_amt[:, j], balance), 0)
+            balance = balance - amt
+            # take from the oldest chunks first
+            before = np.cumsum(chunks, axis=1) - chunks
+            chunks = chunks - np.minimum(chunks, np.maximum(amt[:, None] - before, 0))
+        balance = np.where(active, chunks.sum(axis=1), balance)
+        earning = (chunk_month <= m) & (chunks > 0)
+        principal = np.where(earning, chunks, 0).sum(axis=1)
+        month_int = np.where(active, divide(principal * units, MONTHLY_DIVISOR, rounding), 0)
+        accrued += month_int
+        sched_balance[:, m] = np.where(active, balance, 0)
+        sched_interest[:, m] = month_int
+
+    return {
+        "final_balance": balance,
+        "interest_accrued": accrued,
+        "schedule": {"balance": sched_balance, "interest": sched_interest},
+        "totals": {"final_balance": int(balance.sum()), "interest_accrued": int(accrued.sum())},
+    }
+
+def ledger_simple(initials, terms, apr, rounding: str = "half_even") -> Dict:
+    """ Locked vault / main account over N accounts in int64 cents: the same rounded
+    monthly interest is posted every month of the term. Returns final_balance,
+    interest_accrued and monthly_interest (N,) plus book totals. """
+    initials = to_cents(initials).ravel()
+    n = initials.shape[0]
+    terms = np.maximum(np.broadcast_to(np.asarray(terms, dtype=np.int64), (n,)), 0)
+    units = np.broadcast_to(apr_units(apr), (n,))
+    _check_range(int(np.abs(initials).max()) if n else 0, units)
+    monthly = divide(initials * units, MONTHLY_DIVISOR, rounding)
+    accrued = monthly * terms
+    return {
+        "final_balance": initials,
+        "interest_accrued": accrued,
+        "monthly_interest": monthly,
+        "totals": {"final_balance": int(initials.sum()), "interest_accrued": int(accrued.sum())},
+    }
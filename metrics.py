@@ -0,0 +1,186 @@
+# metrics.py
+import os
+import time
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+METRICS: List["_Metric"] = []  # every metric created, in render order
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        METRICS.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """ Monotonic counter; label values are passed positionally, in labels order. """
+    kind = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Gauge(Counter):
+    """ Value that can go up or down; set() replaces it. """
+    kind = "gauge"
+
+    def set(self, *label_values: str, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+class Histogram(_Metric):
+    """ Fixed-bucket histogram; per-bucket counts are made cumulative only when rendered. """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                running += c
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+def sample_lines(name: str, help: str, value: float, kind: str = "gauge") -> List[str]:
+    """ Exposition lines for a value read at scrape time (e.g. counters kept elsewhere). """
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+def render(extra: Sequence[str] = ()) -> str:
+    """ Prometheus text exposition (format 0.0.4) of every registered metric. """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
+
+# ---------- Shared metrics ----------
+HTTP_LATENCY = Histogram("smartsaver_http_request_duration_seconds",
+                         "Request latency per route", labels=("route", "method"))
+HTTP_REQUESTS = Counter("smartsaver_http_requests_total", "Requests per route and status",
+                        labels=("route", "method", "status"))
+FLEX_SECONDS = Histogram("smartsaver_flex_simulation_seconds", "simulate_flex wall time per call")
+FLEX_MONTHS = Histogram("smartsaver_flex_months_simulated", "Months simulated per simulate_flex call",
+                        buckets=(6, 12, 18, 24, 36, 60, 120, 240, 360, 600))
+FLEX_EVENTS = Histogram("smartsaver_flex_events_processed", "Event months plus withdrawals per simulate_flex call",
+                        buckets=COUNT_BUCKETS)
+FLEX_BATCH_SCENARIOS = Counter("smartsaver_flex_batch_scenarios_total", "Scenarios run through simulate_flex_batch")
+OPENAI_LATENCY = Histogram("smartsaver_openai_request_duration_seconds", "OpenAI chat completion latency",
+                           labels=("mode",))
+OPENAI_TOKENS = Counter("smartsaver_openai_tokens_total", "OpenAI tokens used", labels=("kind",))
+ADVISOR_TOOL_CALLS = Counter("smartsaver_advisor_tool_calls_total", "Tool calls executed by the advisor",
+                             labels=("tool",))
+ADVISOR_FAST_REPLIES = Counter("smartsaver_advisor_fast_replies_total",
+                               "Advisor messages answered from the extraction engine without the LLM")
+OPENAI_IN_FLIGHT = Gauge("smartsaver_openai_in_flight", "OpenAI calls holding a scheduler slot")
+OPENAI_QUEUE_WAIT = Histogram("smartsaver_openai_queue_wait_seconds", "Time OpenAI calls waited for a scheduler slot")
+OPENAI_RETRIES = Counter("smartsaver_openai_retries_total", "OpenAI calls retried, by error", labels=("reason",))
+OPENAI_COALESCED = Counter("smartsaver_openai_coalesced_total",
+                           "OpenAI calls served by an identical call already in flight")
+ADVISOR_CACHE = Counter("smartsaver_advisor_cache_lookups_total", "Advisor response cache lookups",
+                        labels=("result",))
+
+PROCESS_START = Gauge("smartsaver_process_start_time_seconds", "Process start time (Unix epoch seconds)")
+STARTUP_SECONDS = Gauge("smartsaver_startup_seconds", "Seconds from process start until the component was ready",
+                        labels=("component",))
+
+_IMPORTED = time.time()
+
+def process_start_time() -> float:
+    """ When this process started (from /proc on Linux), else when this module was imported. """
+    try:
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])  # field 22, starttime in clock ticks since boot
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return _IMPORTED
+
+def mark_ready(component: str) -> float:
+    """ Record the cold-start time of component (interpreter, imports and setup); returns it. """
+    started = process_start_time()
+    seconds = round(max(time.time() - started, 0.0), 3)
+    PROCESS_START.set(value=round(started, 3))
+    STARTUP_SECONDS.set(component, value=seconds)
+    return seconds
+
+def record_usage(usage):
+    """ Count prompt/completion tokens from an OpenAI usage object (None is ignored). """
+    if usage is None:
+        return
+    OPENAI_TOKENS.inc("prompt", amount=usage.prompt_tokens or 0)
+    OPENAI_TOKENS.inc("completion", amount=usage.completion_tokens or 0)
+
+class MetricsMiddleware:
+    """ ASGI middleware recording latency and status for requests under prefix, labelled by route template. """
+    def __init__(self, app, prefix: str = "/simulate/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+        status = ["500"]
+
+        async def send_tee(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_tee)
+        finally:
+            # the router leaves the matched route in scope: label by its path template, not the URL,
+            # and give unmatched paths one shared label, so raw URLs cannot grow the series count
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - start, route, scope["method"])
+            HTTP_REQUESTS.inc(route, scope["method"], status[0])
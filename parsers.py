@@ -0,0 +1,211 @@
+# parsers.py
+# Streamlit-free text extraction shared by the guided interview in demo.py and advisor.py
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# ---------- Precompiled patterns ----------
+_NUM = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_CURRENCY = r"€|eur(?:os?)?\b"
+# an amount: "€5,000", "5000 eur", "5k", "2.5k", "1500"
+_AMOUNT = rf"(?:€\s*)?(?:{_NUM})(?:\s*k\b)?(?:\s*(?:{_CURRENCY}))?"
+AMOUNT_RE = re.compile(rf"(?P<cur>€\s*)?(?P<num>{_NUM})(?P<k>\s*k\b)?(?P<cur2>\s*(?:{_CURRENCY}))?", re.I)
+NUMBER_RE = re.compile(_NUM)
+
+_WITHDRAW_VERBS = r"withdraw(?:al|ing|s)?|take\s+out|taking\s+out|cash\s+out|pull\s+out|break"
+_TOPUP_VERBS = r"top[\s-]?ups?|topping\s+up|add(?:ing)?|deposit(?:ing)?|contribut(?:e|ing)|put(?:ting)?\s+in"
+_MONTH_REF = r"(?:in|at|after|on|by|during)\s+(?:the\s+)?(?:month\s*(?P<mon>\d+)|(?P<ord>\d+)(?:st|nd|rd|th)\s+month)"
+# patterns start at the amount (a cheap scan for a digit or "€"); the verb before it is
+# matched separately, against the text just ahead of the amount
+_VERB_BEFORE_RE = re.compile(rf"(?P<verb>{_WITHDRAW_VERBS}|{_TOPUP_VERBS})\s+(?:of\s+)?$", re.I)
+# one-off event: "withdraw 1500 in month 8", "add €500 at month 3", "2000 in month 6"
+EVENT_RE = re.compile(rf"(?P<amt>{_AMOUNT})\s*(?:from\s+\w+\s+)?{_MONTH_REF}", re.I)
+_FREQUENCIES = {"week": 0, "month": 1, "quarter": 3, "year": 12, "annum": 12}
+_FREQ_WORDS = {"weekly": "week", "monthly": "month", "quarterly": "quarter", "yearly": "year", "annually": "year"}
+# recurring top-up: "add 100 monthly", "top up €200 every month", "100 per quarter"
+RECURRING_RE = re.compile(rf"(?P<amt>{_AMOUNT})\s*(?:"
+                          rf"(?:a|per|every|each|/)\s*(?P<unit>week|month|quarter|year|annum)\b"
+                          rf"|(?P<adverb>weekly|monthly|quarterly|yearly|annually)\b)", re.I)
+_WORD_NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "six": 6, "eighteen": 18}
+TERM_RE = re.compile(r"\b(?P<n>\d+|an?|one|two|three|four|six|eighteen)[\s-]*(?P<unit>months?|mos?|years?|yrs?)\b", re.I)
+# one pass for every keyword class: products, words that make an amount a request to simulate
+# rather than an incidental number, and advice questions / negations (left to the LLM)
+KEYWORD_RE = re.compile(
+    r"\b(?:(?P<flex>flex)|(?P<locked>locked(?:\s+vault)?|lock\s+vault)|(?P<main>main|classic)"
+    r"|(?P<intent>invest(?:ed|ing)?|save|saving|deposit|put|park|lock|simulate|earn|interest|returns?"
+    r"|how\s+much|what\s+if|start\s+with)"
+    r"|(?P<advice>why|explain|difference|should|better|recommend|advi[cs]e|risk|tax|fees?|vs|versus)"
+    r"|(?P<negation>not|no|never|don't|dont|won't|can't|cannot))\b", re.I)
+_PRODUCT_GROUPS = ("flex", "locked", "main")
+_WITHDRAW_VERB_RE = re.compile(rf"^(?:{_WITHDRAW_VERBS})$", re.I)
+
+GOALS = (
+    ("short_term_goal", re.compile(r"apartment|house|wedding|holiday|\bcars?\b")),
+    ("long_term_growth", re.compile(r"grow|portfolio|long term|retirement|wealth")),
+    ("passive_income", re.compile(r"passive|income|side hustle")),
+    ("flexibility_with_safety", re.compile(r"safe|safety|flexibility|liquid|access")),
+    ("maximum_returns", re.compile(r"max|maximum|returns|yield")),
+)
+YES = frozenset(["yes", "y", "true", "1"])
+NO = frozenset(["no", "n", "false", "0"])
+NO_WITHDRAWAL = frozenset(["none", "no", "n", "0", "skip"])
+
+@dataclass
+class Extraction:
+    """ What extract() found in one message; months are as the user wrote them. """
+    amount: Optional[float] = None
+    amount_explicit: bool = False     # had a currency marker or a simulation verb next to it
+    term_months: Optional[int] = None
+    topup_amount: Optional[float] = None
+    topup_every: Optional[int] = None  # months between recurring top-ups; 0 = weekly
+    topups: List[Tuple[int, float]] = field(default_factory=list)       # one-off (month, amount)
+    withdrawals: List[Tuple[int, float]] = field(default_factory=list)  # (month, amount)
+    unlabelled: List[Tuple[int, float]] = field(default_factory=list)   # "2000 in month 6" without a verb
+    goal: Optional[str] = None
+    product: Optional[str] = None
+    intent: bool = False
+    advice: bool = False
+    negated: bool = False
+    leftovers: int = 0                # numbers not explained by any of the above
+    confidence: float = 0.0
+
+def amount_value(text: str) -> Optional[float]:
+    """ Euro amount from one AMOUNT match ("€5,000", "5k", "1500 eur"). """
+    m = AMOUNT_RE.search(text)
+    if not m:
+        return None
+    value = float(m.group("num").replace(",", ""))
+    return value * 1000 if m.group("k") else value
+
+def _verb_before(text: str, start: int) -> Optional[str]:
+    m = _VERB_BEFORE_RE.search(text, max(0, start - 24), start)
+    return m.group("verb") if m else None
+
+def _mask(text: str, span: Tuple[int, int]) -> str:
+    # blank out a consumed span so its numbers are not picked up again
+    return text[:span[0]] + " " * (span[1] - span[0]) + text[span[1]:]
+
+def _score(ex: Extraction) -> float:
+    """ Confidence that ex is a complete, self-contained simulation request. """
+    if ex.amount is None or ex.amount <= 0:
+        return 0.0
+    score = 0.95 if (ex.amount_explicit or ex.intent) else 0.6
+    if not ex.amount_explicit and ex.amount < 100:
+        score -= 0.4  # small bare numbers are more often ages, counts or turn numbers than deposits
+    score -= 0.3 * ex.leftovers
+    score -= 0.3 * len(ex.unlabelled)
+    if ex.advice:
+        score -= 0.4
+    if ex.negated:
+        score -= 0.3
+    if ex.topup_every == 0:
+        score -= 0.3  # weekly top-ups do not map onto monthly events exactly
+    return round(min(max(score, 0.0), 1.0), 2)
+
+def extract(text: str) -> Extraction:
+    """
+    Amount, term, top-ups, withdrawals, goal and product from free text, with a confidence.
+    Args:
+        text: str - one user message
+    Returns:
+        Extraction; confidence is 0 when no amount was found
+    """
+    ex = Extraction()
+    work = text
+
+    for m in EVENT_RE.finditer(work):
+        amount = amount_value(m.group("amt"))
+        month = int(m.group("mon") or m.group("ord"))
+        verb = _verb_before(work, m.start())
+        if verb is None:
+            ex.unlabelled.append((month, amount))
+        elif _WITHDRAW_VERB_RE.match(verb):
+            ex.withdrawals.append((month, amount))
+        else:
+            ex.topups.append((month, amount))
+        work = _mask(work, m.span())
+
+    m = RECURRING_RE.search(work)
+    if m:
+        ex.topup_amount = amount_value(m.group("amt"))
+        unit = m.group("unit") or _FREQ_WORDS[m.group("adverb").lower()]
+        ex.topup_every = _FREQUENCIES[unit.lower()]
+        work = _mask(work, m.span())
+
+    m = TERM_RE.search(work)
+    if m:
+        n = m.group("n").lower()
+        n = int(n) if n.isdigit() else _WORD_NUMBERS[n]
+        ex.term_months = n * 12 if m.group("unit").lower().startswith("y") else n
+        work = _mask(work, m.span())
+
+    amounts = [a for a in AMOUNT_RE.finditer(work)]
+    if amounts:
+        first = amounts[0]
+        ex.amount = amount_value(first.group(0))
+        ex.amount_explicit = bool(first.group("cur") or first.group("cur2") or first.group("k"))
+        ex.leftovers = len(amounts) - 1
+
+    for m in KEYWORD_RE.finditer(text):
+        kind = m.lastgroup
+        if kind in _PRODUCT_GROUPS:
+            ex.product = ex.product or kind
+        elif kind == "negation":
+            ex.negated = True
+        else:
+            setattr(ex, kind, True)
+    ex.goal = parse_goal(text, default=None)
+    ex.confidence = _score(ex)
+    return ex
+
+# ---------- Interview answer parsers (demo.py) ----------
+def parse_float(text):
+    m = AMOUNT_RE.fullmatch(text.strip())
+    return amount_value(m.group(0)) if m else None
+
+def parse_term(text):
+    # Expect integer 12..24, bare ("18") or with a unit ("18 months", "2 years")
+    text = text.strip()
+    try:
+        val = int(float(text))
+    except (ValueError, OverflowError):  # OverflowError: "inf"
+        m = TERM_RE.fullmatch(text)
+        if not m:
+            return None
+        val = extract(text).term_months
+    if 12 <= val <= 24:
+        return val
+    return None
+
+def parse_bool(text):
+    t = text.strip().lower()
+    if t in YES: return True
+    if t in NO: return False
+    return None
+
+def parse_withdraw(text):
+    t = text.strip().lower()
+    if t in NO_WITHDRAWAL:
+        return None, None
+    ex = extract(t)
+    events = ex.withdrawals or ex.unlabelled
+    if events:
+        month, amount = events[0]
+        return amount, month
+    # bare "2000 6": amount then month
+    nums = NUMBER_RE.findall(t)
+    amt = None
+    mon = None
+    if nums:
+        amt = float(nums[0].replace(",", ""))
+        if len(nums) >= 2:
+            mon = int(float(nums[1].replace(",", "")))
+    return amt, mon
+
+def parse_goal(text: str, default: Optional[str] = "flexibility_with_safety"):
+    t = text.strip().lower()
+    for goal, pattern in GOALS:
+        if pattern.search(t):
+            return goal
+    # Fallback → assume flexibility if unsure
+    return default
@@ -0,0 +1,188 @@
+# profiling.py
+"""
+Opt-in per-request profiling. Off unless SIM_PROFILE_DIR is set, in which case an API
+request sent with "X-Profile: 1" (or every request, with SIM_PROFILE_ALL=1) is profiled
+with cProfile and written to SIM_PROFILE_DIR as <id>.pstats plus <id>.json holding the
+request. Profiles are rate-limited to SIM_PROFILE_PER_MIN per process.
+
+Inspect a dump with `python -m pstats <id>.pstats`, snakeviz, or flameprof/gprof2dot
+for a flamegraph.
+"""
+import os
+import json
+import time
+import uuid
+import pstats
+import asyncio
+import cProfile
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+PROFILE_DIR = os.getenv("SIM_PROFILE_DIR") or None
+PROFILE_ALL = os.getenv("SIM_PROFILE_ALL", "0") == "1"
+PROFILE_PER_MIN = float(os.getenv("SIM_PROFILE_PER_MIN", "6"))
+PROFILE_HEADER = b"x-profile"
+
+# cProfile allows one active profiler per thread (3.12 raises, 3.11 silently replaces it),
+# so at most one session profiles a given thread at a time
+_thread = threading.local()
+
+def _profiling_here() -> bool:
+    return getattr(_thread, "profiling", False)
+
+class ProfileSession:
+    """ One profiled request: a cProfile.Profile per thread it ran on, merged when saved. """
+    def __init__(self, name: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}"
+        self.started = time.perf_counter()
+        self._profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def running(self):
+        """ Profile the enclosed code on the current thread, unless a profiler already runs there. """
+        if _profiling_here():
+            yield
+            return
+        prof = cProfile.Profile()
+        with self._lock:
+            self._profilers.append(prof)
+        _thread.profiling = True
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            _thread.profiling = False
+
+    def save(self, request: Dict) -> str:
+        """ Write <id>.pstats and <id>.json into PROFILE_DIR; returns the path without extension. """
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        stats = None
+        for prof in self._profilers:
+            prof.create_stats()
+            if not prof.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(prof)
+            else:
+                stats.add(prof)
+        if stats is not None:
+            stats.dump_stats(base + ".pstats")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({"id": self.id, "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 3),
+                       "threads": len(self._profilers), "request": request}, f, indent=2, default=str)
+        return base
+
+class _RateLimiter:
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else float("inf")
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next:
+                return False
+            self._next = now + self.interval
+            return True
+
+_LIMITER = _RateLimiter(PROFILE_PER_MIN)
+_session: contextvars.ContextVar[Optional[ProfileSession]] = contextvars.ContextVar("profile_session", default=None)
+
+def profiled(fn):
+    """
+    Decorator for sync code that runs off the event loop (threadpool routes, tool workers).
+    cProfile only sees the thread it is enabled on, so work done there gets its own
+    profiler for the active session. Returns fn untouched when profiling is off.
+    """
+    if PROFILE_DIR is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = _session.get()
+        if session is None or _profiling_here():
+            return fn(*args, **kwargs)
+        with session.running():
+            return fn(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def profile_block(name: str, request: Dict, force: bool = False):
+    """
+    Profile the enclosed block as one request (used by advisor.chat). Runs when profiling
+    is on and either force or SIM_PROFILE_ALL is set, no other profile runs on this thread,
+    subject to the rate limit. Yields the ProfileSession, or None when not profiling.
+    """
+    if (PROFILE_DIR is None or not (force or PROFILE_ALL) or _session.get() is not None
+            or _profiling_here() or not _LIMITER.allow()):
+        yield None
+        return
+    session = ProfileSession(name)
+    token = _session.set(session)
+    try:
+        with session.running():
+            yield session
+    finally:
+        _session.reset(token)
+        session.save(request)
+
+class ProfileMiddleware:
+    """
+    ASGI middleware that profiles requests under prefix which ask for it. The event-loop
+    thread is profiled for the whole request (so validation and serialization show up, along
+    with any concurrent loop work); @profiled code adds its worker threads. Only one request
+    profiles the loop at a time. The response carries X-Profile-Id, or "X-Profile: busy" /
+    "X-Profile: rate-limited" when the request was skipped.
+    """
+    def __init__(self, app, prefix: str = "/simulate/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        if not (PROFILE_ALL or headers.get(PROFILE_HEADER, b"").lower() in (b"1", b"true")):
+            return await self.app(scope, receive, send)
+
+        skipped = b"busy" if _profiling_here() else b"rate-limited" if not _LIMITER.allow() else None
+        if skipped:
+            async def send_skipped(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile", skipped)]
+                await send(message)
+            return await self.app(scope, receive, send_skipped)
+
+        session = ProfileSession(scope["path"].strip("/").replace("/", "_"))
+        chunks = []
+
+        async def receive_tee():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def send_tee(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", session.id.encode())]
+            await send(message)
+
+        token = _session.set(session)
+        try:
+            with session.running():
+                await self.app(scope, receive_tee, send_tee)
+        finally:
+            _session.reset(token)
+            await asyncio.to_thread(session.save, {
+                "method": scope["method"], "path": scope["path"],
+                "query": scope.get("query_string", b"").decode(),
+                "content_type": headers.get(b"content-type", b"").decode(),
+                "body": b"".join(chunks).decode("utf-8", "replace"),
+            })
@@ -0,0 +1,67 @@
+# rates.py
+from typing import Dict, List, Optional
+from calculator import monthly_interest, TopUp, Withdrawal
+from registry import truth_version
+
+def _near_half_cent(x: float) -> bool:
+    # exact half-cent amounts are common; their rounding depends on float evaluation order
+    return abs((x * 100.0) % 1.0 - 0.5) < 1e-6
+
+class RateTables:
+    """
+    Per-euro interest tables built from the truth config.
+    Without withdrawals every product is linear in principal: a euro added at month s and
+    held to term t earns monthly_interest(1, apr) * (t - s). Tables cover terms 0..max_months,
+    so simulations become lookups and multiply-adds. calculator.py stays the reference:
+    results that land on a half cent are left to it so both paths round identically.
+    """
+    def __init__(self, truth: Dict):
+        products = truth["products"]
+        self.version = truth_version(truth)
+        self.max_term = int(truth["terms"]["max_months"])
+        self.aprs = {
+            "flex": products["flex_vault_apr"],
+            "locked": products["locked_vault_apr"],
+            "main": products["main_account_apr"],
+        }
+        terms = range(self.max_term + 1)
+        # simple[product][t]: interest per euro held for t months
+        self.simple = {p: [monthly_interest(1.0, apr) * t for t in terms] for p, apr in self.aprs.items()}
+        # flex[t][s]: interest per euro added at month s of a t-month term
+        per_month = monthly_interest(1.0, self.aprs["flex"])
+        self.flex = [[per_month * (t - s) for s in range(t + 1)] for t in terms]
+
+    def simulate(self, product: str, initial: float, term_months: int, apr: float,
+                 topups: List[TopUp] = None, withdrawals: List[Withdrawal] = None,
+                 output: str = "rows") -> Optional[Dict]:
+        """
+        Answer from the tables, or return None when the scenario is outside them (other APR,
+        term out of range, withdrawals, negative amounts, a flex schedule or a half-cent result).
+        Locked/main have no schedule, so every output mode gives the same answer.
+        """
+        if apr != self.aprs.get(product) or not 0 <= term_months <= self.max_term or initial < 0:
+            return None
+        if product != "flex":
+            accrued = initial * self.simple[product][term_months]
+            if _near_half_cent(accrued):
+                return None
+            return {
+                "final_balance": round(initial, 2),
+                "interest_accrued": round(accrued, 2)
+            }
+        if withdrawals or output != "summary":
+            return None
+        chunks = {0: initial}
+        for t in topups or []:
+            if t.amount < 0:
+                return None
+            chunks[t.month] = chunks.get(t.month, 0) + t.amount
+        row = self.flex[term_months]
+        accrued = sum(amt * row[max(cm, 0)] for cm, amt in chunks.items() if cm < term_months)
+        if _near_half_cent(accrued):
+            return None
+        balance = sum(chunks.values()) if term_months > 0 else initial
+        return {
+            "final_balance": round(balance, 2),
+            "interest_accrued": round(accrued, 2),
+        }
@@ -0,0 +1,144 @@
+# registry.py
+"""
+Shared truth config: truth.json loaded, validated and precomputed once per process.
+
+REGISTRY.get() returns the current Truth snapshot. The file's mtime is checked at most every
+SMARTSAVER_TRUTH_CHECK seconds and the snapshot is rebuilt only when it changed, so callers can
+ask on every request. The path is absolute (SMARTSAVER_TRUTH_PATH, default truth.json next to
+this module), so it works from any working directory. Only the standard library is imported.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from numbers import Real
+from typing import Callable, Dict, List, Optional
+
+TRUTH_PATH = os.getenv("SMARTSAVER_TRUTH_PATH",
+                       os.path.join(os.path.dirname(os.path.abspath(__file__)), "truth.json"))
+CHECK_INTERVAL = float(os.getenv("SMARTSAVER_TRUTH_CHECK", "1.0"))  # seconds between mtime checks
+
+APR_KEYS = {"flex": "flex_vault_apr", "locked": "locked_vault_apr", "main": "main_account_apr"}
+
+class TruthError(ValueError):
+    """ truth.json is missing, unparsable or breaks the schema. """
+
+def truth_version(truth: Dict) -> str:
+    """ Short digest of the truth config; changes whenever a rate or term changes. """
+    return hashlib.sha1(json.dumps(truth, sort_keys=True).encode()).hexdigest()[:12]
+
+def _number(value) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+def _whole(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate(truth) -> Dict:
+    """
+    Check the fields the API, advisor and demo rely on.
+    Returns:
+        truth, unchanged; raises TruthError naming the first bad field
+    """
+    if not isinstance(truth, dict):
+        raise TruthError("truth config must be an object")
+    products, terms, flex = truth.get("products"), truth.get("terms"), truth.get("flex_vault")
+    if not isinstance(products, dict):
+        raise TruthError("products must be an object")
+    for key in APR_KEYS.values():
+        if not _number(products.get(key)) or not 0 <= products[key] <= 100:
+            raise TruthError(f"products.{key} must be a number between 0 and 100")
+    if not isinstance(terms, dict) or not _whole(terms.get("min_months")) or not _whole(terms.get("max_months")):
+        raise TruthError("terms.min_months and terms.max_months must be integers")
+    if not 0 < terms["min_months"] <= terms["max_months"]:
+        raise TruthError("terms must satisfy 0 < min_months <= max_months")
+    if not isinstance(flex, dict) or not _whole(flex.get("max_withdrawals")) or flex["max_withdrawals"] < 0:
+        raise TruthError("flex_vault.max_withdrawals must be a non-negative integer")
+    if not isinstance(flex.get("allow_topups"), bool):
+        raise TruthError("flex_vault.allow_topups must be true or false")
+    return truth
+
+@dataclass(frozen=True)
+class Truth:
+    """ One validated truth config with the values derived from it. Treat config as read-only. """
+    config: Dict
+    version: str
+    aprs: Dict[str, float]           # product -> APR in percent
+    monthly_rates: Dict[str, float]  # product -> interest per euro per month (calculator.monthly_interest(1, apr))
+    min_months: int
+    max_months: int
+    path: str
+    mtime_ns: int
+
+    @classmethod
+    def build(cls, config: Dict, path: str = "", mtime_ns: int = 0) -> "Truth":
+        validate(config)
+        aprs = {p: config["products"][k] for p, k in APR_KEYS.items()}
+        return cls(
+            config=config,
+            version=truth_version(config),
+            aprs=aprs,
+            monthly_rates={p: 1.0 * (apr / 100.0) / 12.0 for p, apr in aprs.items()},
+            min_months=config["terms"]["min_months"],
+            max_months=config["terms"]["max_months"],
+            path=path,
+            mtime_ns=mtime_ns,
+        )
+
+class TruthRegistry:
+    """
+    The current Truth for one file, reloaded when the file changes.
+    A changed file that fails to load or validate is reported in stats() and the previous
+    snapshot stays in use; only the first load raises. subscribe() callbacks run on every
+    (re)load, e.g. to reset caches built from the old rates.
+    """
+    def __init__(self, path: str = TRUTH_PATH, check_interval: float = CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.error: Optional[str] = None
+        self._truth: Optional[Truth] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Truth], None]] = []
+
+    def get(self) -> Truth:
+        truth = self._truth
+        if truth is not None and time.monotonic() - self._checked < self.check_interval:
+            return truth
+        with self._lock:
+            self._check()
+            return self._truth
+
+    def _check(self):
+        self._checked = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if self._truth is not None and mtime == self._truth.mtime_ns:
+                return
+            with open(self.path) as f:
+                truth = Truth.build(json.load(f), self.path, mtime)
+        except (OSError, ValueError) as e:  # json.JSONDecodeError and TruthError are ValueErrors
+            if self._truth is None:
+                raise TruthError(f"cannot load {self.path}: {e}") from e
+            self.error = str(e)
+            return
+        self._truth, self.error = truth, None
+        self.reloads += 1
+        for fn in self._listeners:
+            fn(truth)
+
+    def subscribe(self, fn: Callable[[Truth], None]):
+        """ Call fn(truth) now (if loaded) and after every reload. """
+        with self._lock:
+            self._listeners.append(fn)
+            if self._truth is not None:
+                fn(self._truth)
+
+    def stats(self) -> Dict:
+        truth = self._truth
+        return {"path": self.path, "version": truth.version if truth else None,
+                "reloads": self.reloads, "error": self.error}
+
+REGISTRY = TruthRegistry()
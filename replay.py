@@ -0,0 +1,128 @@
+# replay.py
+"""
+Replay captured /simulate/* traffic (see capture.py) and report latency per route.
+
+    python replay.py requests.jsonl --concurrency 16 --rate 200
+    python replay.py requests.jsonl --in-process --repeat 5
+
+Requests are fired open-loop at --rate per second (0 = as fast as possible) with at
+most --concurrency in flight, against --url or the app in this process (--in-process).
+"""
+import sys
+import json
+import base64
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+def load_corpus(path: str) -> List[Dict]:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            # skip anything that is not a captured request, or whose body was too big to keep
+            if "path" in rec and "method" in rec and not rec.get("truncated"):
+                records.append(rec)
+    return records
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+async def replay(records: List[Dict], client: httpx.AsyncClient, concurrency: int, rate: float) -> Dict:
+    sem = asyncio.Semaphore(concurrency)
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+
+    async def fire(rec):
+        async with sem:
+            url = rec["path"] + (f"?{rec['query']}" if rec.get("query") else "")
+            headers = {"content-type": rec["content_type"]} if rec.get("content_type") else {}
+            body = base64.b64decode(rec["body_b64"]) if "body_b64" in rec else (rec.get("body") or "").encode()
+            start = time.perf_counter()
+            try:
+                resp = await client.request(rec["method"], url, content=body,
+                                            headers=headers)
+                await resp.aread()
+                ok = resp.status_code < 500
+            except httpx.HTTPError:
+                ok = False
+            samples[rec["path"]].append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors[rec["path"]] += 1
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tasks = []
+    for i, rec in enumerate(records):
+        if rate > 0:
+            await asyncio.sleep(max(0.0, start + i / rate - loop.time()))
+        tasks.append(asyncio.create_task(fire(rec)))
+    await asyncio.gather(*tasks)
+    wall = loop.time() - start
+
+    report = {}
+    for route, values in sorted(samples.items()):
+        values.sort()
+        report[route] = {
+            "requests": len(values),
+            "errors": errors[route],
+            "rps": round(len(values) / wall, 2) if wall else 0.0,
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+        }
+    total = sum(len(v) for v in samples.values())
+    report["_total"] = {"requests": total, "errors": sum(errors.values()),
+                        "rps": round(total / wall, 2) if wall else 0.0, "wall_s": round(wall, 3)}
+    return report
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="JSONL file written by the capture middleware")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--in-process", action="store_true", help="call app.app directly instead of --url")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0.0, help="requests per second, 0 = unthrottled")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the corpus this many times")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    records = load_corpus(args.corpus) * args.repeat
+    if not records:
+        print("no replayable requests in corpus", file=sys.stderr)
+        return 1
+
+    async def run():
+        if args.in_process:
+            from app import app
+            transport, base_url = httpx.ASGITransport(app=app), "http://replay"
+        else:
+            transport, base_url = None, args.url
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=30) as client:
+            return await replay(records, client, args.concurrency, args.rate)
+
+    report = asyncio.run(run())
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'route':28s} {'reqs':>7s} {'errs':>5s} {'rps':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+        for route, r in report.items():
+            if route != "_total":
+                print(f"{route:28s} {r['requests']:7d} {r['errors']:5d} {r['rps']:9.1f} "
+                      f"{r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f}")
+        t = report["_total"]
+        print(f"total {t['requests']} requests, {t['errors']} errors, {t['rps']:.1f} req/s over {t['wall_s']:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
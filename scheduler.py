@@ -0,0 +1,323 @@
+# scheduler.py
+"""
+Admission control for the advisor's OpenAI calls.
+
+CallScheduler caps how many calls run at once; threads and event loops share one limit.
+Identical calls that overlap in time are coalesced into one request (single-flight), and
+every caller gets its result. Rate-limit and transient errors are retried with jittered
+exponential backoff until the call's deadline. Only the standard library and metrics.py
+are imported, so the scheduler is testable against fake_openai.py or a plain function.
+"""
+import os
+import time
+import random
+import asyncio
+import inspect
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from metrics import OPENAI_COALESCED, OPENAI_IN_FLIGHT, OPENAI_QUEUE_WAIT, OPENAI_RETRIES
+
+RETRY_STATUSES = frozenset([408, 409, 429])  # plus every 5xx
+# OpenAI SDK connection/timeout errors carry no status code; matched by class name (no SDK import)
+_TRANSIENT = frozenset(["APIConnectionError", "APITimeoutError", "ConnectionError", "TimeoutError"])
+
+class DeadlineExceeded(TimeoutError):
+    """ No concurrency slot, or no successful attempt, before the call's deadline. """
+
+def retry_reason(exc: BaseException) -> Optional[str]:
+    """ Why exc is worth retrying ("429", "503", "APIConnectionError", ...), or None if it is not. """
+    if isinstance(exc, DeadlineExceeded):
+        return None
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return str(status) if status in RETRY_STATUSES or status >= 500 else None
+    for cls in type(exc).__mro__:
+        if cls.__name__ in _TRANSIENT:
+            return cls.__name__
+    return None
+
+def retry_after(exc: BaseException) -> float:
+    """ Seconds the server asked to wait (retry-after-ms / retry-after headers), else 0. """
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        return float(headers.get("retry-after") or 0)
+    except (TypeError, ValueError):  # an HTTP date instead of seconds
+        return 0.0
+
+class _Limiter:
+    """
+    Counting semaphore shared by threads and event loops. Waiters are served first in,
+    first out; release() hands the slot straight to the next waiter.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()  # threading.Event (threads) or asyncio.Future (event loops)
+
+    def _try(self, waiter) -> bool:
+        # with self._lock held
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        self._waiters.append(waiter)
+        return False
+
+    def _withdraw(self, waiter) -> bool:
+        """ Remove a waiter that gave up; False when it was handed a slot meanwhile. """
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                return True
+            return False
+
+    def acquire(self, timeout: float) -> bool:
+        event = threading.Event()
+        with self._lock:
+            if self._try(event):
+                return True
+        return event.wait(max(timeout, 0)) or not self._withdraw(event)
+
+    async def aacquire(self, timeout: float) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            if self._try(future):
+                return True
+        try:
+            await asyncio.wait_for(future, max(timeout, 0))
+            return True
+        except asyncio.TimeoutError:
+            return not self._withdraw(future)
+        except asyncio.CancelledError:
+            if not self._withdraw(future):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.active -= 1
+                return
+            waiter = self._waiters.popleft()
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            waiter.get_loop().call_soon_threadsafe(_grant, waiter)
+
+def _grant(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+    # a cancelled waiter finds itself withdrawn-but-granted and releases the slot itself
+
+async def _close(stream):
+    close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+    if close is not None:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
+class _Stream:
+    """ One upstream stream read by every coalesced caller; items are kept until it ends. """
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._grew = asyncio.Event()
+
+    def push(self, item):
+        self.items.append(item)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done, self.error = True, error
+        self._wake()
+
+    def _wake(self):
+        self._grew.set()
+        self._grew = asyncio.Event()
+
+    async def read(self) -> AsyncIterator:
+        i = 0
+        while True:
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._grew.wait()
+
+class CallScheduler:
+    """
+    Concurrency limit, single-flight coalescing and retries for outgoing calls.
+    call() is for blocking calls (run from threads); astream() for async streams.
+    Requests are coalesced by the key the caller passes: same key, same request.
+    """
+    def __init__(self, max_concurrency: int = 8, max_retries: int = 6, backoff: float = 0.5,
+                 max_backoff: float = 8.0, deadline: float = 60.0, coalesce: bool = True):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.coalesce = coalesce
+        self._limiter = _Limiter(max(max_concurrency, 1))
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._streams: Dict[tuple, _Stream] = {}
+
+    def _retry_delay(self, exc: BaseException, attempt: int, end: float) -> Optional[float]:
+        """ Seconds to wait before retrying after exc, or None to give up and raise it. """
+        reason = retry_reason(exc)
+        if reason is None or attempt >= self.max_retries:
+            return None
+        # full jitter, but never sooner than the server asked for
+        delay = max(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)), retry_after(exc))
+        if time.monotonic() + delay >= end:
+            return None
+        OPENAI_RETRIES.inc(reason)
+        return delay
+
+    def _admitted(self, started: float, ok: bool):
+        OPENAI_QUEUE_WAIT.observe(time.monotonic() - started)
+        if not ok:
+            raise DeadlineExceeded("no OpenAI call slot free before the deadline")
+        OPENAI_IN_FLIGHT.inc(amount=1)
+
+    def _release(self):
+        OPENAI_IN_FLIGHT.inc(amount=-1)
+        self._limiter.release()
+
+    # ---------- Blocking calls ----------
+    def call(self, fn: Callable[[float], Any], key: Optional[str] = None, deadline: Optional[float] = None):
+        """
+        fn(timeout) under the concurrency limit, retried on transient errors until the deadline.
+        Args:
+            fn: makes the request; gets the seconds left, to use as its own timeout
+            key: identity of the request; callers with the same key while it runs share its
+                 result (None: never coalesced)
+            deadline: seconds for the whole call, queueing and retries included
+        Returns:
+            fn's result; raises its last error, or DeadlineExceeded
+        """
+        if key is None or not self.coalesce:
+            return self._run(fn, deadline)
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = Future()
+        if not leader:
+            OPENAI_COALESCED.inc()
+            return flight.result()
+        try:
+            flight.set_result(self._run(fn, deadline))
+        except BaseException as e:
+            flight.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return flight.result()
+
+    def _run(self, fn: Callable[[float], Any], deadline: Optional[float]):
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            self._admitted(started, self._limiter.acquire(end - started))
+            try:
+                return fn(max(end - time.monotonic(), 0.001))
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, end)
+                if delay is None:
+                    raise
+            finally:
+                self._release()
+            time.sleep(delay)
+            attempt += 1
+
+    # ---------- Async streams ----------
+    async def astream(self, open_stream: Callable[[float], Awaitable], key: Optional[str] = None,
+                      deadline: Optional[float] = None) -> AsyncIterator:
+        """
+        Items of the async iterable `await open_stream(timeout)` returns, with call()'s limit,
+        retries and deadline. An attempt is retried only if it fails before its first item.
+        Callers on the same event loop with the same key read one upstream stream; it is
+        cancelled once every reader has stopped.
+        """
+        loop = asyncio.get_running_loop()
+        flight, slot = None, (id(loop), key)
+        if key is not None and self.coalesce:
+            with self._lock:
+                flight = self._streams.get(slot)
+            if flight is not None:
+                OPENAI_COALESCED.inc()
+        if flight is None:
+            flight = _Stream()
+            if key is not None and self.coalesce:
+                with self._lock:
+                    self._streams[slot] = flight
+            flight.task = loop.create_task(self._pump(flight, open_stream, deadline, slot))
+        flight.readers += 1
+        try:
+            async for item in flight.read():
+                yield item
+        finally:
+            flight.readers -= 1
+            if not flight.readers and not flight.done:
+                flight.task.cancel()
+
+    async def _pump(self, flight: _Stream, open_stream: Callable[[float], Awaitable],
+                    deadline: Optional[float], slot: tuple):
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt, error = 0, None
+        try:
+            while True:
+                started = time.monotonic()
+                self._admitted(started, await self._limiter.aacquire(end - started))
+                stream = None
+                try:
+                    stream = await open_stream(max(end - time.monotonic(), 0.001))
+                    async for item in stream:
+                        flight.push(item)
+                    break
+                except Exception as e:
+                    # once items went out a retry would repeat them
+                    delay = None if flight.items else self._retry_delay(e, attempt, end)
+                    if delay is None:
+                        raise
+                finally:
+                    try:
+                        await _close(stream)
+                    finally:
+                        self._release()
+                await asyncio.sleep(delay)
+                attempt += 1
+        except Exception as e:
+            error = e
+        except asyncio.CancelledError as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                if self._streams.get(slot) is flight:
+                    del self._streams[slot]
+            flight.finish(error)
+
+def scheduler_from_env() -> CallScheduler:
+    """ CallScheduler configured by the ADVISOR_OPENAI_* variables. """
+    return CallScheduler(
+        max_concurrency=int(os.getenv("ADVISOR_OPENAI_CONCURRENCY", "8")),
+        max_retries=int(os.getenv("ADVISOR_OPENAI_RETRIES", "6")),
+        backoff=float(os.getenv("ADVISOR_OPENAI_BACKOFF", "0.5")),
+        max_backoff=float(os.getenv("ADVISOR_OPENAI_BACKOFF_MAX", "8")),
+        deadline=float(os.getenv("ADVISOR_OPENAI_DEADLINE", "60")),
+        coalesce=os.getenv("ADVISOR_OPENAI_COALESCE", "1") == "1",
+    )
@@ -0,0 +1,258 @@
+# sessions.py
+"""
+Server-side advisor conversations.
+
+Sessions keep their recent messages, with token counts, in memory or in a local SQLite file,
+so a caller sends only a session id and the new message. fold() keeps the newest messages
+that fit a token budget and folds older ones into a running summary, so the prompt sent per
+turn stays about the same size however long the conversation gets.
+"""
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+from parsers import extract
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # optional: tiktoken missing (or its encoding unavailable offline)
+    _ENCODING = None
+
+_EVERY = {0: "weekly", 1: "monthly", 3: "quarterly", 12: "yearly"}
+MESSAGE_OVERHEAD = 4  # tokens the chat format adds around every message
+LOW_WATER = 0.75      # fold down to this share of the budget, so folding is not needed every turn
+PURGE_INTERVAL = 60.0  # seconds between sweeps for expired sessions
+
+def count_tokens(text: str) -> int:
+    """ Tokens in text: exact with tiktoken, else ~4 characters per token. """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+def message(role: str, content: str) -> Dict:
+    return {"role": role, "content": content, "tokens": count_tokens(content or "") + MESSAGE_OVERHEAD}
+
+@dataclass
+class Session:
+    """ Unsummarized messages (oldest first) plus the summary of the `folded` messages before them. """
+    id: str
+    messages: List[Dict] = field(default_factory=list)
+    summary: str = ""
+    folded: int = 0
+    updated: float = 0.0
+
+    def tokens(self) -> int:
+        return sum(m["tokens"] for m in self.messages)
+
+    def history(self) -> List[Dict[str, str]]:
+        """ Messages to send: the summary (if any) as a system message, then the window. """
+        head = [{"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}] if self.summary else []
+        return head + [{"role": m["role"], "content": m["content"]} for m in self.messages]
+
+def facts_summary(previous: str, dropped: List[Dict]) -> str:
+    """ Local summarizer: the plan details the user gave in dropped turns, as "- key: value" lines. """
+    facts = dict(line[2:].split(": ", 1) for line in previous.splitlines() if line.startswith("- ") and ": " in line)
+    for m in dropped:
+        if m["role"] != "user":
+            continue
+        ex = extract(m["content"])
+        if ex.amount:
+            facts["amount"] = f"€{ex.amount:,.2f}"
+        if ex.term_months:
+            facts["term"] = f"{ex.term_months} months"
+        if ex.topup_amount:
+            facts["recurring top-up"] = f"€{ex.topup_amount:,.2f} {_EVERY[ex.topup_every]}"
+        for month, amount in ex.topups:
+            facts[f"top-up in month {month}"] = f"€{amount:,.2f}"
+        for month, amount in ex.withdrawals:
+            facts[f"withdrawal in month {month}"] = f"€{amount:,.2f}"
+        if ex.goal:
+            facts["goal"] = ex.goal
+        if ex.product:
+            facts["product of interest"] = ex.product
+    facts["earlier messages"] = str(int(facts.get("earlier messages", "0")) + len(dropped))
+    return "\n".join(f"- {k}: {v}" for k, v in facts.items())
+
+def window(history: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+    """ The newest messages of a caller-supplied history that fit budget tokens, starting at a user turn. """
+    total, start = 0, len(history)
+    while start > 0:
+        tokens = count_tokens(history[start - 1].get("content") or "") + MESSAGE_OVERHEAD
+        if total + tokens > budget:
+            break
+        total += tokens
+        start -= 1
+    while start < len(history) and history[start].get("role") == "assistant":
+        start += 1
+    return history[start:]
+
+def fold(session: Session, budget: int, summarize: Callable[[str, List[Dict]], str] = facts_summary) -> bool:
+    """
+    Fold the oldest messages into session.summary once the window is over budget tokens.
+    Whole turns are dropped (the window never starts with an assistant message) down to
+    LOW_WATER * budget; the newest message is always kept. Returns True if anything was folded.
+    """
+    total = session.tokens() + count_tokens(session.summary)
+    if total <= budget:
+        return False
+    drop, target = 0, budget * LOW_WATER
+    while drop < len(session.messages) - 1 and (total > target or session.messages[drop]["role"] != "user"):
+        total -= session.messages[drop]["tokens"]
+        drop += 1
+    if not drop:
+        return False
+    session.summary = summarize(session.summary, session.messages[:drop])
+    session.messages = session.messages[drop:]
+    session.folded += drop
+    return True
+
+class SessionStore:
+    """
+    In-memory sessions, least recently used evicted beyond max_sessions or after ttl seconds idle.
+    lock(session_id) serializes turns of one session (striped, so the lock count stays fixed).
+    """
+    def __init__(self, max_sessions: int = 10_000, ttl: float = 86_400.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(64)]
+
+    def lock(self, session_id: str) -> threading.Lock:
+        return self._stripes[hash(session_id) % len(self._stripes)]
+
+    def load(self, session_id: str) -> Session:
+        """ The session's state (a new, empty one if unknown or expired); edit it, then save(). """
+        with self._lock:
+            s = self._data.get(session_id)
+            if s is None or s.updated + self.ttl < time.time():
+                return Session(session_id)
+            return Session(s.id, list(s.messages), s.summary, s.folded, s.updated)
+
+    def save(self, session: Session):
+        session.updated = time.time()
+        with self._lock:
+            self._data[session.id] = session
+            self._data.move_to_end(session.id)
+            while len(self._data) > self.max_sessions:
+                self._data.popitem(last=False)
+            self._purge(session.updated - self.ttl)
+
+    def _purge(self, cutoff: float) -> int:
+        # with self._lock held; saves keep _data ordered by updated, oldest first
+        purged = 0
+        while self._data and next(iter(self._data.values())).updated < cutoff:
+            self._data.popitem(last=False)
+            purged += 1
+        return purged
+
+    def purge_expired(self) -> int:
+        """ Drop every session idle for more than ttl seconds; returns how many. """
+        with self._lock:
+            return self._purge(time.time() - self.ttl)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"sessions": len(self._data), "max_sessions": self.max_sessions, "ttl": self.ttl}
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a local SQLite file, shared across processes and restarts. The full transcript
+    is kept on disk; load() reads only the unsummarized window, so a turn costs the same
+    however long the conversation is. Expired sessions are deleted when loaded, and save()
+    sweeps out the rest at most every PURGE_INTERVAL seconds.
+    """
+    def __init__(self, path: str, ttl: float = 86_400.0):
+        super().__init__(max_sessions=0, ttl=ttl)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, summary TEXT NOT NULL, "
+                         "folded INTEGER NOT NULL, size INTEGER NOT NULL, updated REAL NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS messages (session_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+                         "role TEXT NOT NULL, content TEXT, tokens INTEGER NOT NULL, PRIMARY KEY (session_id, seq))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        self._purged = 0.0
+
+    def load(self, session_id: str) -> Session:
+        with self._lock:
+            row = self._db.execute("SELECT summary, folded, updated FROM sessions WHERE id = ?",
+                                   (session_id,)).fetchone()
+            if row is None:
+                return Session(session_id)
+            if row[2] + self.ttl < time.time():
+                # expired: drop the old rows so save() starts the new conversation from seq 0
+                self._delete(session_id)
+                return Session(session_id)
+            summary, folded, updated = row
+            rows = self._db.execute("SELECT role, content, tokens FROM messages WHERE session_id = ? AND seq >= ? "
+                                    "ORDER BY seq", (session_id, folded)).fetchall()
+        return Session(session_id, [{"role": r, "content": c, "tokens": t} for r, c, t in rows], summary, folded, updated)
+
+    def save(self, session: Session):
+        session.updated = time.time()
+        size = session.folded + len(session.messages)
+        with self._lock:
+            stored = self._db.execute("SELECT size FROM sessions WHERE id = ?", (session.id,)).fetchone()
+            start = stored[0] if stored else 0
+            # messages are append-only: write the ones past what is already stored
+            new = [(session.id, seq, m["role"], m["content"], m["tokens"])
+                   for seq, m in enumerate(session.messages, session.folded) if seq >= start]
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)", new)
+            self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                             (session.id, session.summary, session.folded, size, session.updated))
+            self._db.execute("COMMIT")
+            if session.updated - self._purged >= PURGE_INTERVAL:
+                self._purge(session.updated - self.ttl)
+
+    def _delete(self, session_id: str):
+        # with self._lock held
+        self._db.execute("BEGIN")
+        self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        self._db.execute("COMMIT")
+
+    def _purge(self, cutoff: float) -> int:
+        # with self._lock held
+        self._purged = time.time()
+        self._db.execute("BEGIN")
+        self._db.execute("DELETE FROM messages WHERE session_id IN (SELECT id FROM sessions WHERE updated < ?)",
+                         (cutoff,))
+        purged = self._db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,)).rowcount
+        self._db.execute("COMMIT")
+        return purged
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._delete(session_id)
+
+    def transcript(self, session_id: str) -> List[Dict[str, str]]:
+        """ Every message of the session, including folded ones. """
+        with self._lock:
+            rows = self._db.execute("SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq",
+                                    (session_id,)).fetchall()
+        return [{"role": r, "content": c} for r, c in rows]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sessions, messages = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        return {"sessions": sessions, "messages": messages, "ttl": self.ttl, "path": self.path}
+
+def session_store_from_env() -> SessionStore:
+    """ SQLite store at ADVISOR_SESSION_DB if set, else in-memory. """
+    ttl = float(os.getenv("ADVISOR_SESSION_TTL", "86400"))
+    path = os.getenv("ADVISOR_SESSION_DB")
+    if path:
+        return SQLiteSessionStore(path, ttl=ttl)
+    return SessionStore(max_sessions=int(os.getenv("ADVISOR_MAX_SESSIONS", "10000")), ttl=ttl)